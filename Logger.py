@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import argparse
+import configparser
+
+from lib.ltacc import LiveTuningAccess
+from lib.symmap import SYMMap, SymbolRegistry
+from lib.channels import GAUGE_DEFINITIONS, select_channels, bind_channels, channel_spans
+from lib.scheduler import ChannelScheduler
+from lib.acquisition import AcquisitionWorker
+from lib.datalog import DataLogThread
+from lib.filetransfer import ConsoleProgress
+
+# Headless datalogger: same channels and log format as the tuner, no Tk.
+
+def unique_log_filename(directory, base_name="live_data"):
+    i = 1
+    while True:
+        filename = os.path.join(directory, f"{base_name}_{i:03d}.bin")
+        if not os.path.exists(filename):
+            return filename
+        i += 1
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    prefs = configparser.ConfigParser()
+    prefs.read(os.path.join(script_dir, 'prefs.cfg'))
+    canbus = prefs['CANBUS'] if prefs.has_section('CANBUS') else {}
+
+    parser = argparse.ArgumentParser(description="Headless T6e live-data logger.")
+    parser.add_argument("-i", "--interface", default=canbus.get('interface', 'socketcan'))
+    parser.add_argument("-c", "--channel", default=canbus.get('channel', 'can0'))
+    parser.add_argument("-b", "--bitrate", type=int, default=500000)
+    parser.add_argument("-s", "--sym", default=None,
+        help="symbol file (default: the one of the ECU firmware, from patch/)")
+    parser.add_argument("-n", "--channels", default=None,
+        help="comma separated channel names (default: all gauges)")
+    parser.add_argument("-r", "--tick-rate", type=float, default=0,
+        help="scheduler ticks per second, 0 for as fast as the bus allows (default)")
+    parser.add_argument("-o", "--output", default=None, help="datalog file (default: live_data_NNN.bin)")
+    parser.add_argument("-d", "--duration", type=float, default=0, help="seconds to log, 0 until Ctrl-C")
+    parser.add_argument("--stats", type=float, default=5.0, help="seconds between throughput reports")
+    parser.add_argument("--list", action="store_true", help="list the channel names and exit")
+    args = parser.parse_args()
+
+    if(args.list):
+        for c in GAUGE_DEFINITIONS: print(f"{c['name']} ({c['rate']} Hz)")
+        return 0
+
+    if(args.channels): channels = select_channels([n.strip() for n in args.channels.split(',')])
+    else: channels = GAUGE_DEFINITIONS
+    output = args.output or unique_log_filename(os.getcwd())
+
+    fp = ConsoleProgress()
+    lta = LiveTuningAccess(fp)
+    lta.open_can(args.interface, args.channel, args.bitrate)
+    try:
+        registry = SymbolRegistry(os.path.join(script_dir, "patch"))
+        if(args.sym):
+            sym = SYMMap(args.sym)
+            if(registry.identify(lta) == None): fp.log("Unknown firmware, using the given symbols.")
+        else:
+            sym = registry.identify(lta)
+            if(sym == None):
+                fp.log("Unsupported ECU!")
+                return 1
+        fp.log(f"Symbols from {sym.file}")
+        bound = bind_channels(channels, sym)
+        spans = channel_spans(channels, sym)
+        # Fixed cadence at the given rate, otherwise back to back ticks that
+        # keep the channel rate ratios.
+        scheduler = ChannelScheduler(spans, args.tick_rate or None)
+        period = scheduler.period if(args.tick_rate > 0) else 0
+        writer = DataLogThread(output, bound)
+        writer.start()
+        acq = AcquisitionWorker(lta, scheduler, period)
+        acq.add_listener(writer.put)
+        errors = {'count': 0}
+        def count_errors(snap):
+            if(snap.error != None): errors['count'] += 1
+        acq.add_listener(count_errors)
+        fp.log(f"Logging {len(bound)} channels to {output}, Ctrl-C to stop.")
+        start = last = time.perf_counter()
+        last_seq = 0
+        acq.start()
+        try:
+            while(args.duration == 0 or time.perf_counter() - start < args.duration):
+                time.sleep(0.1)
+                if(writer.error): raise writer.error
+                now = time.perf_counter()
+                if(now - last < args.stats): continue
+                snap = acq.get_latest()
+                seq = snap.seq if(snap) else 0
+                fp.log(f"{now-start:8.1f} s: {(seq-last_seq)/(now-last):7.1f} ticks/s, {seq} ticks, {errors['count']} errors")
+                last, last_seq = now, seq
+        except KeyboardInterrupt:
+            pass
+        finally:
+            acq.stop()
+            writer.close()
+        fp.log(f"Stopped, {output} written.")
+    finally:
+        lta.close_can()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import threading
+import time
+from contextlib import contextmanager
+from collections import deque
+
+class Snapshot:
+    # timestamp is time.perf_counter_ns() taken when the reads started.
+    def __init__(self, seq, timestamp, image, error=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+        self.error = error
+
+class AcquisitionWorker(threading.Thread):
+    """
+    Polls a ReadPlan on its own thread at a fixed cadence.
+
+    The worker owns the LiveTuningAccess: every other access to the bus must
+    go through read_memory/write_memory below or exclusive(), so the CAN
+    request/answer pairs never interleave. The GUI only picks the newest
+    snapshot and never waits on the bus: unverified writes are queued and
+    sent by the worker between two ticks, their last failure is kept in
+    write_error.
+    """
+    def __init__(self, lta, plan, period=0.05, history=256):
+        threading.Thread.__init__(self, name="AcquisitionWorker", daemon=True)
+        self.lta = lta
+        self.plan = plan
+        self.period = period
+        self.lock = threading.RLock()
+        self.snap_lock = threading.Lock()
+        self.history = deque(maxlen=history)
+        self.latest = None
+        self.listeners = []
+        self.stop_event = threading.Event()
+        self.writes = deque() # (address, data) not sent yet
+        self.write_lock = threading.Lock()
+        self.write_error = None
+
+    def run(self):
+        image = self.plan.new_image()
+        seq = 0
+        deadline = time.perf_counter()
+        while(not self.stop_event.is_set()):
+            error = None
+            with self.lock:
+                timestamp = time.perf_counter_ns()
+                try:
+                    self.plan.execute(self.lta, image)
+                except Exception as e:
+                    error = e
+                self.send_writes()
+            seq += 1
+            snap = Snapshot(seq, timestamp, image.copy(), error)
+            with self.snap_lock:
+                self.latest = snap
+                self.history.append(snap)
+                listeners = list(self.listeners)
+            # Listeners get every snapshot, they must not block (use a queue).
+            for listener in listeners:
+                listener(snap)
+            deadline += self.period
+            delay = deadline - time.perf_counter()
+            if(delay < 0):
+                # Late, restart the cadence from now instead of bursting.
+                deadline = time.perf_counter()
+                delay = 0
+            self.stop_event.wait(delay)
+
+    def stop(self):
+        self.stop_event.set()
+        if(self.is_alive()): self.join()
+        # The last edits still go out.
+        with self.lock:
+            self.send_writes()
+
+    def add_listener(self, listener):
+        with self.snap_lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self.snap_lock:
+            self.listeners.remove(listener)
+
+    def get_latest(self):
+        with self.snap_lock:
+            return self.latest
+
+    def get_history(self, since_seq=0):
+        with self.snap_lock:
+            return [s for s in self.history if s.seq > since_seq]
+
+    def send_writes(self):
+        # Caller holds self.lock.
+        while(True):
+            with self.write_lock:
+                if(not self.writes): return
+                address, data = self.writes.popleft()
+            try:
+                self.lta.write_memory(address, data)
+            except Exception as e:
+                self.write_error = e
+
+    @contextmanager
+    def exclusive(self):
+        # Direct use of the LiveTuningAccess, after the queued writes.
+        with self.lock:
+            self.send_writes()
+            yield self.lta
+
+    def read_memory(self, address, size):
+        with self.exclusive() as lta:
+            return lta.read_memory(address, size)
+
+    def read_buffer(self, address, size):
+        with self.exclusive() as lta:
+            return lta.read_buffer(address, size)
+
+    def write_memory(self, address, data, verify=False):
+        if(not verify):
+            # Queued for the worker, a write still pending is not repeated.
+            data = bytes(data)
+            with self.write_lock:
+                if((address, data) not in self.writes): self.writes.append((address, data))
+            return
+        with self.exclusive() as lta:
+            return lta.write_memory(address, data, verify)
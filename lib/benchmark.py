@@ -0,0 +1,123 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from lib.ltacc import LiveTuningAccess
+from lib.ecu_emulator import EcuEmulator
+from lib.filetransfer import ConsoleProgress
+from lib.symmap import SYMMap
+from lib.channels import GAUGE_DEFINITIONS, bind_channels, channel_spans, ChannelCodec
+from lib.readplan import ReadPlan
+from lib.scheduler import ChannelScheduler
+
+# Throughput/latency benchmarks of LiveTuningAccess against EcuEmulator.
+#
+#   python -m lib.benchmark [--latency ms] [--jitter ms] [--repeat n]
+#
+# Every case reports ops/s, p50/p99 latency of one op and CAN frames (both
+# directions) per payload byte, as counted by the emulator.
+
+CAL_SIZE = 0x3CB4
+RAM_ADDRESS = 0x40001000
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples)-1, int(len(samples)*p/100))]
+
+class Benchmark:
+    def __init__(self, latency=0.0, jitter=0.0, channel="t6e-bench"):
+        self.channel = channel
+        self.ecu = EcuEmulator("virtual", channel, latency=latency, jitter=jitter, seed=0)
+        self.ecu.add_region(0x40000000, os.urandom(0x10000))
+        self.sym = SYMMap(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patch", "T6eP138.sym"))
+        self.cal_base = self.sym.get_sym_addr("cal_base")
+        self.ecu.poke(self.cal_base, b"P138")
+        self.lta = LiveTuningAccess(ConsoleProgress(quiet=True))
+        self.results = []
+
+    def start(self):
+        self.ecu.start()
+        self.lta.open_can("virtual", self.channel, 500000)
+
+    def stop(self):
+        self.lta.close_can()
+        self.ecu.stop()
+
+    def run(self, name, fn, repeat, payload):
+        fn() # warm up
+        frames = self.ecu.frames_in + self.ecu.frames_out
+        samples = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            t = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        frames = self.ecu.frames_in + self.ecu.frames_out - frames
+        self.results.append((name, repeat/elapsed, percentile(samples, 50), percentile(samples, 99),
+            frames/(payload*repeat) if(payload) else 0.0))
+
+    def report(self, out=sys.stdout):
+        out.write(f"{'case':<34} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'frames/B':>9}\n")
+        for name, ops, p50, p99, fpb in self.results:
+            out.write(f"{name:<34} {ops:>10.1f} {p50*1000:>9.3f} {p99*1000:>9.3f} {fpb:>9.3f}\n")
+
+    def all(self, repeat):
+        lta = self.lta
+        self.run("read word (0x50)", lambda: lta.read_memory(RAM_ADDRESS, 4), repeat*10, 4)
+        for size in (8, 32, 128, 255):
+            self.run(f"read buffer {size} B (0x53)", lambda: lta.read_memory(RAM_ADDRESS, size), repeat, size)
+        blocks = [(RAM_ADDRESS + i*256, 255) for i in range(16)]
+        self.run("read_many 16 x 255 B", lambda: lta.read_many(blocks), max(1, repeat//10), 16*255)
+
+        codec = ChannelCodec(bind_channels(GAUGE_DEFINITIONS, self.sym))
+        plan = ReadPlan([(address, size) for address, size, rate in channel_spans(GAUGE_DEFINITIONS, self.sym)])
+        image = plan.new_image()
+        def gauge_tick():
+            plan.execute(lta, image)
+            codec.decode(image)
+        self.run("gauge tick (all channels)", gauge_tick, repeat, sum(size for address, size in plan.blocks))
+        scheduler = ChannelScheduler(channel_spans(GAUGE_DEFINITIONS, self.sym))
+        sched_image = scheduler.new_image()
+        tick_payload = sum(sum(size for address, size in p.blocks) for p in scheduler.plans if p) / scheduler.cycle
+        self.run("scheduler tick", lambda: scheduler.execute(lta, sched_image), repeat, tick_payload)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "calrom.bin")
+            cases = max(1, repeat//50)
+            self.run("cal download+verify 0x3CB4", lambda: lta.download_verify(self.cal_base, CAL_SIZE, filename), cases, CAL_SIZE)
+            # Uploads are differential, alternate two images that differ in
+            # one 256 byte table.
+            with open(filename, 'rb') as f:
+                changed = bytearray(f.read())
+            changed[0x1000:0x1100] = bytes(b ^ 0xFF for b in changed[0x1000:0x1100])
+            changed_filename = os.path.join(directory, "calrom-changed.bin")
+            with open(changed_filename, 'wb') as f:
+                f.write(changed)
+            files = [filename, changed_filename]
+            def upload():
+                files.reverse()
+                lta.upload_verify(self.cal_base, files[0])
+            self.run("cal upload+verify 256 B changed", upload, cases, 256)
+            lta.load_shadow(self.cal_base, CAL_SIZE)
+            self.run("cal load_shadow 0x3CB4", lambda: lta.load_shadow(self.cal_base, CAL_SIZE), cases, CAL_SIZE)
+            lta.invalidate_shadow()
+
+def main():
+    parser = argparse.ArgumentParser(description="LiveTuningAccess benchmarks against the ECU emulator.")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulated answer delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="emulated random extra delay in ms")
+    parser.add_argument("--repeat", type=int, default=200, help="base number of iterations per case")
+    args = parser.parse_args()
+    bench = Benchmark(args.latency/1000, args.jitter/1000)
+    bench.start()
+    try:
+        bench.all(args.repeat)
+    finally:
+        bench.stop()
+    bench.report()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
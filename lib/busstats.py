@@ -0,0 +1,123 @@
+import threading
+import time
+
+# Answer latency histogram, upper bound of each bucket in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, float('inf'))
+
+def frame_bits(dlc):
+    # Standard 11-bit frame: 47 bits of overhead (incl. interframe space)
+    # plus data, with ~10% bit stuffing.
+    return (47 + 8 * dlc) * 1.1
+
+class BusStats:
+    """
+    Transport counters of a LiveTuningAccess: requests and answer latency
+    per opcode, timeouts, retries, unexpected answers and frames/bytes each way.
+    """
+    def __init__(self, bitrate=500000):
+        self.lock = threading.Lock()
+        self.bitrate = bitrate
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.start = time.perf_counter()
+            self.requests = {}
+            self.latency = {}
+            self.timeouts = 0
+            self.retries = 0
+            self.dlc_errors = 0
+            self.frames_in = self.frames_out = 0
+            self.bytes_in = self.bytes_out = 0
+            self.bits = 0.0
+
+    def frame_out(self, msg):
+        with self.lock:
+            self.frames_out += 1
+            self.bytes_out += msg.dlc
+            self.bits += frame_bits(msg.dlc)
+
+    def frame_in(self, msg):
+        with self.lock:
+            self.frames_in += 1
+            self.bytes_in += msg.dlc
+            self.bits += frame_bits(msg.dlc)
+
+    def request(self, opcode):
+        with self.lock:
+            self.requests[opcode] = self.requests.get(opcode, 0) + 1
+
+    def answer(self, opcode, seconds):
+        with self.lock:
+            hist = self.latency.setdefault(opcode, [0] * len(LATENCY_BUCKETS))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if(seconds <= bound):
+                    hist[i] += 1
+                    break
+
+    def timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def dlc_error(self):
+        with self.lock:
+            self.dlc_errors += 1
+
+    def get(self):
+        """Returns a consistent copy of the counters, with rates."""
+        with self.lock:
+            elapsed = max(time.perf_counter() - self.start, 1e-9)
+            hist = [0] * len(LATENCY_BUCKETS)
+            for h in self.latency.values():
+                hist = [a + b for a, b in zip(hist, h)]
+            return {
+                'elapsed': elapsed,
+                'requests': dict(self.requests),
+                'latency': {opcode: list(h) for opcode, h in self.latency.items()},
+                'latency_hist': hist,
+                'latency_p50': percentile(hist, 50),
+                'latency_p99': percentile(hist, 99),
+                'timeouts': self.timeouts,
+                'retries': self.retries,
+                'dlc_errors': self.dlc_errors,
+                'frames_in': self.frames_in,
+                'frames_out': self.frames_out,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'bits': self.bits,
+                'bitrate': self.bitrate,
+                'requests_per_s': sum(self.requests.values()) / elapsed,
+                'bus_load': self.bits / elapsed / self.bitrate
+            }
+
+def delta(stats, prev):
+    """
+    stats (from get()) with the rates and latency percentiles taken since
+    prev, an earlier get(), instead of since the start. Counters stay totals.
+    """
+    if(prev == None or stats['elapsed'] <= prev['elapsed']): return stats # None or reset since
+    elapsed = stats['elapsed'] - prev['elapsed']
+    hist = [a - b for a, b in zip(stats['latency_hist'], prev['latency_hist'])]
+    result = dict(stats)
+    result.update({
+        'latency_hist': hist,
+        'latency_p50': percentile(hist, 50),
+        'latency_p99': percentile(hist, 99),
+        'requests_per_s': (sum(stats['requests'].values()) - sum(prev['requests'].values())) / elapsed,
+        'bus_load': (stats['bits'] - prev['bits']) / elapsed / stats['bitrate']
+    })
+    return result
+
+def percentile(hist, p):
+    # Upper bound of the bucket holding the p-th percentile, None when empty.
+    total = sum(hist)
+    if(total == 0): return None
+    count = 0
+    for n, bound in zip(hist, LATENCY_BUCKETS):
+        count += n
+        if(count * 100 >= total * p): return bound
+    return LATENCY_BUCKETS[-1]
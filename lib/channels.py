@@ -0,0 +1,424 @@
+# Live-data channels shown by the tuner gauges.
+#
+# Each channel is a RAM symbol of 'size' bytes (big endian, 'signed' or not)
+# and its value is raw * scale + offset. 'derive' optionally computes the
+# shown value from the scaled one and the values decoded before it, listed in
+# 'needs'. 'rate' is the wanted sample rate in Hz, see ChannelScheduler.
+# ChannelCodec compiles a channel list into one struct layout.
+
+import struct
+
+# numpy is optional, it only speeds up ChannelCodec.decode_many()
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Some constants for calculated values
+LSB_WEIGHT_FOR_RAW_MAF_TO_MG_STROKE = 0.25
+NUMBER_OF_CYLINDERS = 6
+CONVERSION_DIVISOR_FOR_GS = 120000.0
+
+GAUGE_DEFINITIONS = ({
+    'name': "Engine Speed",
+    'fmt': "{:.0f} rpm",
+    'low': 0,
+    'high': 7500,
+    'symbol': "engine_speed",
+    'size': 2,
+    'scale': 0.25,
+    'rate': 50
+},{
+    'name': "Engine Load",
+    'fmt': "{:.0f} mg/str.",
+    'low': 60,
+    'high': 864,
+    'symbol': "engine_load",
+    'size': 2,
+    'rate': 50
+},{
+    'name': "Coolant",
+    'fmt': "{:.1f} °C",
+    'low': 20,
+    'high': 110,
+    'symbol': "coolant",
+    'size': 1,
+    'scale': 5/8,
+    'offset': -40,
+    'rate': 1
+},{
+    'name': "Intake Air",
+    'fmt': "{:.1f} °C",
+    'low': 20,
+    'high': 70,
+    'symbol': "air",
+    'size': 1,
+    'scale': 5/8,
+    'offset': -40,
+    'rate': 1
+},{
+    'name': "MAF",
+    'fmt': "{:.1f} g/s",
+    'low': 0,
+    'high': 300,
+    'symbol': "MAF",
+    'size': 2,
+    'scale': LSB_WEIGHT_FOR_RAW_MAF_TO_MG_STROKE,
+    'derive': lambda value, live: value * live["Engine Speed"] * NUMBER_OF_CYLINDERS / CONVERSION_DIVISOR_FOR_GS,
+    'needs': ("Engine Speed",),
+    'rate': 20
+},{
+    'name': "TPS",
+    'fmt': "{:.1f} %",
+    'low': 0,
+    'high': 100,
+    'symbol': "TPS",
+    'size': 2,
+    'scale': 100/1023,
+    'rate': 20
+},{
+    'name': "Pedal",
+    'fmt': "{:.1f} %",
+    'low': 0,
+    'high': 100,
+    'symbol': "PPS",
+    'size': 2,
+    'scale': 100/1023,
+    'rate': 20
+},{
+    'name': "Tip In",
+    'fmt': "{:.1f} us",
+    'low': 0,
+    'high': 900,
+    'symbol': "tipin",
+    'size': 1,
+    'scale': 1/255,
+    'rate': 10
+},{
+    'name': "Pulse Width Bank 1",
+    'fmt': "{:d} us",
+    'low': 0,
+    'high': 15000,
+    'symbol': "pulsewidth_b1",
+    'size': 2,
+    'rate': 10
+},{
+    'name': "Pulse Width Bank 2",
+    'fmt': "{:d} us",
+    'low': 0,
+    'high': 15000,
+    'symbol': "pulsewidth_b2",
+    'size': 2,
+    'rate': 10
+},{
+    'name': "O2 Voltage Bank 1",
+    'fmt': "{:.2f} v",
+    'low': 0,
+    'high': 15000,
+    'symbol': "nbo2_b1",
+    'size': 2,
+    'scale': 5/16383,
+    'rate': 10
+},{
+    'name': "O2 Voltage Bank 2",
+    'fmt': "{:.2f} v",
+    'low': 0,
+    'high': 15000,
+    'symbol': "nbo2_b2",
+    'size': 2,
+    'scale': 5/16383,
+    'rate': 10
+},{
+    'name': "STFT Bank 1",
+    'fmt': "{:.1f} %",
+    'low': -10,
+    'high': 10,
+    'symbol': "stft_b1",
+    'size': 2,
+    'signed': True,
+    'scale': 1/20,
+    'rate': 10
+},{
+    'name': "STFT Bank 2",
+    'fmt': "{:.1f} %",
+    'low': -10,
+    'high': 10,
+    'symbol': "stft_b2",
+    'size': 2,
+    'signed': True,
+    'scale': 1/20,
+    'rate': 10
+},{
+    'name': "LTFT Bank 1",
+    'fmt': "{:.1f} %",
+    'low': -10,
+    'high': 10,
+    'symbol': "ltft_b1",
+    'size': 2,
+    'signed': True,
+    'scale': 1/20,
+    'rate': 1
+},{
+    'name': "LTFT Bank 2",
+    'fmt': "{:.1f} %",
+    'low': -10,
+    'high': 10,
+    'symbol': "ltft_b2",
+    'size': 2,
+    'signed': True,
+    'scale': 1/20,
+    'rate': 1
+},{
+    'name': "Target AFR",
+    'fmt': "{:.2f} AFR",
+    'low': 10,
+    'high': 20,
+    'symbol': "afr_target",
+    'size': 2,
+    'scale': 1/100,
+    'rate': 10
+},{
+    'name': "Gear",
+    'fmt': "{:d} #",
+    'low': 0,
+    'high': 6,
+    'symbol': "gear",
+    'size': 2,
+    'rate': 5
+},{
+    'name': "Ign 1",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "ign_1",
+    'size': 2,
+    'signed': True,
+    'scale': -1/4,
+    'offset': 387.5,
+    'rate': 20
+},{
+    'name': "Ign 2",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "ign_2",
+    'size': 2,
+    'signed': True,
+    'scale': -1/4,
+    'offset': 687.5,
+    'rate': 20
+},{
+    'name': "Ign 3",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "ign_3",
+    'size': 2,
+    'signed': True,
+    'scale': -1/4,
+    'offset': 987.5,
+    'rate': 20
+},{
+    'name': "Ign 4",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "ign_4",
+    'size': 2,
+    'signed': True,
+    'scale': -1/4,
+    'offset': 1287.5,
+    'rate': 20
+},{
+    'name': "Ign 5",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "ign_5",
+    'size': 2,
+    'signed': True,
+    'scale': -1/4,
+    'offset': 1587.5,
+    'rate': 20
+},{
+    'name': "Ign 6",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "ign_6",
+    'size': 2,
+    'signed': True,
+    'scale': -1/4,
+    'offset': 87.5,
+    'rate': 20
+},{
+    'name': "KR 1",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "kr_1",
+    'size': 1,
+    'signed': True,
+    'scale': 1/4,
+    'rate': 50
+},{
+    'name': "KR 2",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "kr_2",
+    'size': 1,
+    'signed': True,
+    'scale': 1/4,
+    'rate': 50
+},{
+    'name': "KR 3",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "kr_3",
+    'size': 1,
+    'signed': True,
+    'scale': 1/4,
+    'rate': 50
+},{
+    'name': "KR 4",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "kr_4",
+    'size': 1,
+    'signed': True,
+    'scale': 1/4,
+    'rate': 50
+},{
+    'name': "KR 5",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "kr_5",
+    'size': 1,
+    'signed': True,
+    'scale': 1/4,
+    'rate': 50
+},{
+    'name': "KR 6",
+    'fmt': "{:.2f} °",
+    'low': -10,
+    'high': 50,
+    'symbol': "kr_6",
+    'size': 1,
+    'signed': True,
+    'scale': 1/4,
+    'rate': 50
+},{
+    'name': "Battery Voltage",
+    'fmt': "{:.2f} v",
+    'low': 8,
+    'high': 18,
+    'symbol': "vbat",
+    'size': 1,
+    'scale': 7/64,
+    'rate': 1
+})
+
+def select_channels(names, channels=GAUGE_DEFINITIONS):
+    """Picks channels by name, with the channels they need, in decoding order."""
+    wanted = set(names)
+    for c in channels:
+        if(c['name'] in wanted): wanted.update(c.get('needs', ()))
+    unknown = set(names) - set(c['name'] for c in channels)
+    if(unknown): raise KeyError(f"Unknown channels: {', '.join(sorted(unknown))}")
+    return tuple(c for c in channels if c['name'] in wanted)
+
+def bind_channels(channels, sym):
+    """Resolves the channel symbols once, returns (channel, address) pairs."""
+    return [(c, sym.get_sym_addr(c['symbol'])) for c in channels]
+
+def channel_spans(channels, sym):
+    return [(sym.get_sym_addr(c['symbol']), c['size'], c.get('rate', 1)) for c in channels]
+
+STRUCT_TYPES = {(1, False): 'B', (1, True): 'b', (2, False): 'H', (2, True): 'h', (4, False): 'I', (4, True): 'i'}
+
+class ChannelCodec:
+    """
+    Decodes bound channels from a MemoryImage with one precompiled struct
+    layout instead of one int.from_bytes per channel.
+
+    The layout starts at the lowest channel address, every channel is a
+    big endian field at its offset with pad bytes in between. Overlapping
+    channels go to a second layout. decode_many() decodes a whole batch of
+    images at once, column-wise, with numpy when it is installed.
+    """
+    def __init__(self, bound):
+        self.channels = [c for c, address in bound]
+        self.names = [c['name'] for c in self.channels]
+        self.base = min(address for c, address in bound)
+        self.size = max(address + c['size'] for c, address in bound) - self.base
+        self.scaling = [(c.get('scale', 1), c.get('offset', 0)) for c in self.channels]
+        self.derived = [(i, c['derive']) for i, c in enumerate(self.channels) if('derive' in c)]
+        # Layouts of (struct, channel indexes in field order)
+        fields = sorted((address - self.base, i) for i, (c, address) in enumerate(bound))
+        self.layouts = []
+        while(fields):
+            fmt, order, end, rest = '>', [], 0, []
+            for offset, i in fields:
+                c = self.channels[i]
+                if(offset < end):
+                    rest.append((offset, i))
+                    continue
+                fmt += f"{offset-end}x" if(offset > end) else ""
+                fmt += STRUCT_TYPES[(c['size'], c.get('signed', False))]
+                order.append(i)
+                end = offset + c['size']
+            self.layouts.append((struct.Struct(fmt), order))
+            fields = rest
+        if(numpy != None):
+            self.dtype = numpy.dtype({
+                'names': [f"c{i}" for i in range(len(bound))],
+                'formats': [f">{'i' if c.get('signed', False) else 'u'}{c['size']}" for c in self.channels],
+                'offsets': [address - self.base for c, address in bound],
+                'itemsize': self.size
+            })
+
+    def raw(self, image):
+        """Raw integers of one image, in channel order."""
+        raw = [0] * len(self.channels)
+        offset = self.base - image.base
+        for layout, order in self.layouts:
+            for i, value in zip(order, layout.unpack_from(image.data, offset)):
+                raw[i] = value
+        return raw
+
+    def scale(self, raw):
+        values = [v * s + o for v, (s, o) in zip(raw, self.scaling)]
+        if(self.derived):
+            named = dict(zip(self.names, values))
+            for i, derive in self.derived:
+                values[i] = named[self.names[i]] = derive(values[i], named)
+        return values
+
+    def decode(self, image):
+        """{name: value} of one image."""
+        return dict(zip(self.names, self.scale(self.raw(image))))
+
+    def decode_many(self, images):
+        """
+        Raw and scaled columns of a batch of images: (raw, values), raw is
+        one column per channel in channel order and values {name: column}.
+        Columns are numpy arrays when numpy is installed, lists otherwise.
+        """
+        if(numpy == None):
+            rows = [self.raw(image) for image in images]
+            raw = [list(column) for column in zip(*rows)] if(rows) else [[] for c in self.channels]
+            values = [self.scale(r) for r in rows]
+            return raw, dict(zip(self.names, ([list(column) for column in zip(*values)] if(values) else raw)))
+        buffer = b"".join(image.data[self.base-image.base:self.base-image.base+self.size] for image in images)
+        samples = numpy.frombuffer(buffer, dtype=self.dtype)
+        raw = [samples[f"c{i}"] for i in range(len(self.channels))]
+        named = {}
+        for name, column, (s, o) in zip(self.names, raw, self.scaling):
+            named[name] = column * s + o
+        for i, derive in self.derived:
+            named[self.names[i]] = derive(named[self.names[i]], named)
+        return raw, named
@@ -0,0 +1,198 @@
+import csv
+import json
+import math
+import queue
+import struct
+import sys
+import threading
+import time
+from lib.channels import ChannelCodec, STRUCT_TYPES
+
+# numpy is optional, it only speeds up DataLogWriter.write_many() and
+# DataLogReader.columns()
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Binary datalog layout (little endian):
+#   magic "T6LOG", u8 version, u32 header length, JSON header
+#   then fixed-size records: u64 timestamp in ns + one field per channel.
+# Timestamps are time.perf_counter_ns() taken when the sample was acquired.
+# The JSON header lists the channels as {name, type, scale, offset}, where
+# type is a struct code. The shown value is raw * scale + offset.
+MAGIC = b"T6LOG"
+VERSION = 1
+
+def log_channels(channels):
+    """Header entries of the channels, derived values are stored as floats."""
+    header = []
+    for c in channels:
+        if('derive' in c):
+            header.append({'name': c['name'], 'type': 'f', 'scale': 1, 'offset': 0})
+        else:
+            header.append({
+                'name': c['name'],
+                'type': STRUCT_TYPES[(c['size'], c.get('signed', False))],
+                'scale': c.get('scale', 1),
+                'offset': c.get('offset', 0)
+            })
+    return header
+
+class DataLogWriter:
+    def __init__(self, filename, bound, buffering=1<<16):
+        self.codec = ChannelCodec(bound)
+        self.header = log_channels(self.codec.channels)
+        self.record = struct.Struct('<Q' + ''.join(h['type'] for h in self.header))
+        if(numpy != None):
+            self.dtype = numpy.dtype([('t', '<u8')] + [(f"c{i}", '<' + h['type']) for i, h in enumerate(self.header)])
+        self.file = open(filename, 'wb', buffering=buffering)
+        header = json.dumps({'channels': self.header}).encode('utf-8')
+        self.file.write(MAGIC + struct.pack('<BI', VERSION, len(header)) + header)
+
+    def write(self, timestamp_ns, image):
+        self.write_many([timestamp_ns], [image])
+
+    def write_many(self, timestamps, images):
+        # One decode for the whole batch, raw fields except derived values.
+        raw, values = self.codec.decode_many(images)
+        columns = [timestamps] + [values[c['name']] if('derive' in c) else raw[i]
+            for i, c in enumerate(self.codec.channels)]
+        if(numpy == None):
+            for row in zip(*columns):
+                self.file.write(self.record.pack(*row))
+        else:
+            records = numpy.empty(len(timestamps), dtype=self.dtype)
+            for name, column in zip(self.dtype.names, columns):
+                records[name] = column
+            self.file.write(records.tobytes())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class DataLogThread(threading.Thread):
+    """
+    Writes acquisition snapshots from a queue on its own thread, so neither
+    the acquisition nor the GUI ever waits for the disk. The file is flushed
+    at most every flush_period seconds.
+    """
+    def __init__(self, filename, bound, flush_period=1.0):
+        threading.Thread.__init__(self, name="DataLogThread", daemon=True)
+        self.writer = DataLogWriter(filename, bound)
+        self.flush_period = flush_period
+        self.queue = queue.Queue()
+        self.error = None
+
+    def put(self, snap):
+        self.queue.put(snap)
+
+    def run(self):
+        last_flush = time.perf_counter()
+        running = True
+        try:
+            while(running):
+                try:
+                    batch = [self.queue.get(timeout=self.flush_period)]
+                except queue.Empty:
+                    batch = []
+                while(True):
+                    try: batch.append(self.queue.get_nowait())
+                    except queue.Empty: break
+                if(None in batch): running = False
+                good = [snap for snap in batch if(snap != None and snap.error == None)]
+                if(good): self.writer.write_many([snap.timestamp for snap in good], [snap.image for snap in good])
+                if(time.perf_counter() - last_flush >= self.flush_period):
+                    self.writer.flush()
+                    last_flush = time.perf_counter()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.writer.close()
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+class DataLogReader:
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        head = self.file.read(len(MAGIC) + 5)
+        if(head[:len(MAGIC)] != MAGIC): raise ValueError(f"{filename} is not a T6 datalog!")
+        version, length = struct.unpack('<BI', head[len(MAGIC):])
+        if(version != VERSION): raise ValueError(f"Unsupported datalog version {version}!")
+        self.channels = json.loads(self.file.read(length).decode('utf-8'))['channels']
+        self.record = struct.Struct('<Q' + ''.join(h['type'] for h in self.channels))
+
+    def raw_records(self, records_per_read=4096):
+        # Yields (timestamp_ns, raw0, raw1, ...) tuples.
+        while(True):
+            data = self.file.read(self.record.size * records_per_read)
+            usable = len(data) - len(data) % self.record.size
+            if(usable == 0): return
+            yield from self.record.iter_unpack(data[:usable])
+
+    def columns(self, records_per_read=65536):
+        """
+        Yields batches of (timestamps_ns, {name: values}) with the scaling
+        applied, numpy arrays when numpy is installed, lists otherwise.
+        """
+        names = [h['name'] for h in self.channels]
+        scaling = [(h['scale'], h['offset']) for h in self.channels]
+        if(numpy != None):
+            dtype = numpy.dtype([('t', '<u8')] + [(f"c{i}", '<' + h['type']) for i, h in enumerate(self.channels)])
+        while(True):
+            data = self.file.read(self.record.size * records_per_read)
+            usable = len(data) - len(data) % self.record.size
+            if(usable == 0): return
+            if(numpy != None):
+                records = numpy.frombuffer(data[:usable], dtype=dtype)
+                yield records['t'], {n: records[f"c{i}"] * s + o for i, (n, (s, o)) in enumerate(zip(names, scaling))}
+            else:
+                columns = list(zip(*self.record.iter_unpack(data[:usable])))
+                yield list(columns[0]), {n: [v * s + o for v in c] for n, (s, o), c in zip(names, scaling, columns[1:])}
+
+    def records(self):
+        # Yields (timestamp_ns, [value, ...]) with the scaling applied.
+        scaling = [(h['scale'], h['offset']) for h in self.channels]
+        for r in self.raw_records():
+            yield r[0], [v * s + o for v, (s, o) in zip(r[1:], scaling)]
+
+    def close(self):
+        self.file.close()
+
+def channel_decimals(h):
+    # Decimals of raw * scale + offset: exact when it takes at most 4,
+    # otherwise one more than the step needs. 3 for stored floats.
+    if(h['type'] in ('f', 'd')): return 3
+    exact = max(len(f"{float(v):.10f}".rstrip('0').split('.')[1]) for v in (h['scale'], h['offset']))
+    if(exact <= 4): return exact
+    return max(0, math.ceil(-math.log10(abs(h['scale'])))) + 1
+
+def log_to_csv(filename, csv_filename):
+    """Converts a binary datalog to the tuner CSV layout, with a leading time column."""
+    log = DataLogReader(filename)
+    try:
+        names = [h['name'] for h in log.channels]
+        formats = [f"{{:.{channel_decimals(h)}f}}" for h in log.channels]
+        with open(csv_filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Time (s)"] + names)
+            start = None
+            # Formatted column by column, a batch at a time.
+            for timestamps, columns in log.columns():
+                if(start == None): start = int(timestamps[0])
+                text = [[f"{(int(t)-start)/1e9:.4f}" for t in timestamps]]
+                text += [[fmt.format(v) for v in columns[n].tolist()] if(numpy != None) else [fmt.format(v) for v in columns[n]]
+                    for n, fmt in zip(names, formats)]
+                writer.writerows(zip(*text))
+    finally:
+        log.close()
+
+if __name__ == "__main__":
+    if(len(sys.argv) not in (2, 3)):
+        print("Usage: python -m lib.datalog live_data_001.bin [live_data_001.csv]")
+        sys.exit(1)
+    log_to_csv(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else sys.argv[1].rsplit('.', 1)[0] + ".csv")
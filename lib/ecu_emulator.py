@@ -0,0 +1,178 @@
+import argparse
+import heapq
+import random
+import sys
+import threading
+import time
+import can
+
+# Some constants
+BO_BE = 'big'
+RAM_BASE = 0x40000000
+RAM_SIZE = 0x010000
+
+class EcuEmulator(threading.Thread):
+    """
+    Answers the live-tuning protocol like the patched T6e ECU does, so the
+    real LiveTuningAccess framing, timeouts and chunking can run without a car.
+
+    Requests arrive on 0x50-0x57 and answers go out on 0x7A0. Memory is a
+    set of regions (RAM by default), unmapped reads return zeros. latency and
+    jitter (seconds) delay every answer, drop_rate is the probability that a
+    request is ignored and answer_drop_rate the probability that a single
+    answer frame is lost.
+
+    Delayed answers wait in a queue (heap by due time) served by a sender
+    thread, so pipelined requests get their latency in parallel as on the
+    real bus. Due times never go backwards: answers keep the request order,
+    the protocol has no tags to match them otherwise.
+    """
+    read_sizes = {0x50: 4, 0x51: 2, 0x52: 1}
+    write_sizes = {0x54: 4, 0x55: 2, 0x56: 1}
+
+    def __init__(self, interface="virtual", channel="t6e", bitrate=500000,
+            latency=0.0, jitter=0.0, drop_rate=0.0, answer_drop_rate=0.0, seed=None):
+        threading.Thread.__init__(self, name="EcuEmulator", daemon=True)
+        self.bus = can.Bus(interface=interface, channel=channel, bitrate=bitrate)
+        self.regions = [(RAM_BASE, bytearray(RAM_SIZE))]
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.answer_drop_rate = answer_drop_rate
+        self.random = random.Random(seed)
+        self.pending_write = None # [address, remaining size, data] of a 0x57
+        self.frames_in = 0
+        self.frames_out = 0
+        self.stop_event = threading.Event()
+        self.delayed = [] # (due time, sequence, payload), a heap
+        self.delayed_seq = 0
+        self.last_due = 0.0
+        self.delayed_cond = threading.Condition()
+        self.sender = threading.Thread(target=self.send_delayed, name="EcuEmulatorSender", daemon=True)
+
+    def add_region(self, address, data):
+        self.regions.insert(0, (address, bytearray(data)))
+
+    def load(self, address, filename):
+        with open(filename, 'rb') as f:
+            self.poke(address, f.read())
+
+    def region(self, address, size):
+        for base, data in self.regions:
+            if(address >= base and address + size <= base + len(data)):
+                return base, data
+        return None, None
+
+    def peek(self, address, size):
+        base, data = self.region(address, size)
+        if(data == None): return bytes(size)
+        return bytes(data[address-base:address-base+size])
+
+    def poke(self, address, value):
+        base, data = self.region(address, len(value))
+        if(data == None): return
+        data[address-base:address-base+len(value)] = value
+
+    def answer(self, payload):
+        if(self.latency or self.jitter):
+            with self.delayed_cond:
+                due = max(self.last_due, time.perf_counter() + self.latency + self.random.uniform(0, self.jitter))
+                self.last_due = due
+                self.delayed_seq += 1
+                heapq.heappush(self.delayed, (due, self.delayed_seq, bytes(payload)))
+                self.delayed_cond.notify()
+            return
+        self.send_answer(payload)
+
+    def send_delayed(self):
+        while(not self.stop_event.is_set()):
+            with self.delayed_cond:
+                if(not self.delayed):
+                    self.delayed_cond.wait(0.1)
+                    continue
+                wait = self.delayed[0][0] - time.perf_counter()
+                if(wait > 0):
+                    self.delayed_cond.wait(wait)
+                    continue
+                due, seq, payload = heapq.heappop(self.delayed)
+            self.send_answer(payload)
+
+    def send_answer(self, payload):
+        for offset in range(0, len(payload), 8):
+            if(self.random.random() < self.answer_drop_rate): continue
+            self.bus.send(can.Message(
+                is_extended_id = False, arbitration_id = 0x7A0,
+                data = payload[offset:offset+8]
+            ))
+            self.frames_out += 1
+
+    def handle(self, msg):
+        opcode = msg.arbitration_id
+        if(opcode == 0x57 and self.pending_write != None):
+            self.pending_write[2] += msg.data
+            self.pending_write[1] -= len(msg.data)
+            if(self.pending_write[1] <= 0):
+                self.poke(self.pending_write[0], self.pending_write[2])
+                self.pending_write = None
+            return
+        if(msg.dlc < 4): return
+        address = int.from_bytes(msg.data[0:4], BO_BE)
+        if(self.random.random() < self.drop_rate): return
+        if(opcode in self.read_sizes):
+            self.answer(self.peek(address, self.read_sizes[opcode]))
+        elif(opcode == 0x53 and msg.dlc == 5):
+            self.answer(self.peek(address, msg.data[4]))
+        elif(opcode in self.write_sizes and msg.dlc == 4 + self.write_sizes[opcode]):
+            self.poke(address, bytes(msg.data[4:]))
+        elif(opcode == 0x57 and msg.dlc == 5):
+            self.pending_write = [address, msg.data[4], bytearray()]
+
+    def run(self):
+        self.sender.start()
+        while(not self.stop_event.is_set()):
+            msg = self.bus.recv(timeout=0.1)
+            if(msg == None or msg.is_extended_id): continue
+            if(msg.arbitration_id < 0x50 or msg.arbitration_id > 0x57): continue
+            self.frames_in += 1
+            self.handle(msg)
+
+    def stop(self):
+        self.stop_event.set()
+        with self.delayed_cond:
+            self.delayed_cond.notify()
+        if(self.is_alive()): self.join()
+        if(self.sender.is_alive()): self.sender.join()
+        self.bus.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="T6e live-tuning ECU emulator.")
+    parser.add_argument("-i", "--interface", default="socketcan", help="python-can interface (socketcan for vcan0)")
+    parser.add_argument("-c", "--channel", default="vcan0")
+    parser.add_argument("-b", "--bitrate", type=int, default=500000)
+    parser.add_argument("--ram", default=None, help="calram.bin image loaded at 0x40000000")
+    parser.add_argument("--cal", default=None, help="calrom-tuner.bin image loaded at --cal-base")
+    parser.add_argument("--cal-base", type=lambda v: int(v, 0), default=0x40008e24)
+    parser.add_argument("--ident", default="P138", help="firmware ID written at --cal-base when no image sets it")
+    parser.add_argument("--latency", type=float, default=0.0, help="answer delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra answer delay in ms")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability of ignoring a request")
+    parser.add_argument("--drop-answer", type=float, default=0.0, help="probability of losing an answer frame")
+    args = parser.parse_args()
+
+    ecu = EcuEmulator(args.interface, args.channel, args.bitrate,
+        args.latency/1000, args.jitter/1000, args.drop, args.drop_answer)
+    if(args.ram): ecu.load(RAM_BASE, args.ram)
+    if(args.cal): ecu.load(args.cal_base, args.cal)
+    if(not args.ram and not args.cal): ecu.poke(args.cal_base, args.ident.encode('ascii'))
+    print(f"ECU emulator on {args.interface} {args.channel}, Ctrl-C to stop.")
+    ecu.start()
+    try:
+        while(ecu.is_alive()): time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    ecu.stop()
+    print(f"{ecu.frames_in} frames in, {ecu.frames_out} frames out.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import random
+import time
+from lib.ltacc import ECUException
+
+class FileTransfer:
+    """
+    Chunked download/upload/verify used by LiveTuningAccess. Subclasses
+    provide log() and the progress_*() reporting.
+    """
+    def download(self, address, size, filename, read_fn, chunk_size):
+        self.log(f"Downloading from 0x{address:08X} (size {size} bytes) to {filename}")
+        self.progress_start(size)
+        bytes_read = 0
+        # Chunks are written as they arrive, nothing is held in memory.
+        with open(filename, 'wb') as f:
+            while bytes_read < size:
+                current_chunk_size = min(chunk_size, size - bytes_read)
+                f.write(read_fn(address + bytes_read, current_chunk_size))
+                bytes_read += current_chunk_size
+                self.progress(bytes_read)
+        self.progress_end()
+        self.log("Download complete.")
+
+    def upload(self, address, filename, write_fn, chunk_size, use_fp=True, start_offset=0, size_to_upload=None, chunk_pause=0):
+        with open(filename, 'rb') as f:
+            f.seek(start_offset)
+            file_data = f.read()
+
+        if size_to_upload is None:
+            size_to_upload = len(file_data)
+        else:
+            file_data = file_data[:size_to_upload] # Ensure we only use the specified size
+
+        self.log(f"Uploading {len(file_data)} bytes from {filename} to 0x{address:08X}")
+        if use_fp:
+            self.progress_start(len(file_data))
+
+        bytes_written = 0
+        while bytes_written < len(file_data):
+            current_chunk = file_data[bytes_written:bytes_written + chunk_size]
+            write_fn(address + bytes_written, current_chunk)
+            bytes_written += len(current_chunk)
+            if use_fp:
+                self.progress(bytes_written)
+            if chunk_pause:
+                time.sleep(chunk_pause)
+        if use_fp:
+            self.progress_end()
+        self.log("Upload complete.")
+
+    def verify(self, address, filename, read_fn, chunk_size):
+        self.log(f"Verifying {filename} against 0x{address:08X}")
+        with open(filename, 'rb') as f:
+            file_data = f.read()
+
+        self.progress_start(len(file_data))
+        bytes_verified = 0
+        while bytes_verified < len(file_data):
+            current_chunk_size = min(chunk_size, len(file_data) - bytes_verified)
+            ecu_chunk = read_fn(address + bytes_verified, current_chunk_size)
+            file_chunk = file_data[bytes_verified : bytes_verified + current_chunk_size]
+
+            if ecu_chunk != file_chunk:
+                self.log(f"Verification FAILED at 0x{address + bytes_verified:08X}")
+                raise ECUException("Verification failed!") # Re-raise the exception from ltacc
+            
+            bytes_verified += current_chunk_size
+            self.progress(bytes_verified)
+        self.log("Verification SUCCESSFUL!")
+        self.progress_end()
+
+    def upload_ranges(self, address, filename, write_fn, ranges, chunk_size, chunk_pause=0):
+        # Upload only the (offset, size) ranges of the file, one progress bar.
+        with open(filename, 'rb') as f:
+            file_data = f.read()
+        total = sum(size for offset, size in ranges)
+        self.log(f"Uploading {total} changed bytes in {len(ranges)} ranges from {filename} to 0x{address:08X}")
+        self.progress_start(total)
+        bytes_written = 0
+        for offset, size in ranges:
+            for chunk_offset in range(offset, offset + size, chunk_size):
+                current_chunk = file_data[chunk_offset:min(chunk_offset + chunk_size, offset + size)]
+                write_fn(address + chunk_offset, current_chunk)
+                bytes_written += len(current_chunk)
+                self.progress(bytes_written)
+                if chunk_pause:
+                    time.sleep(chunk_pause)
+        self.progress_end()
+        self.log("Upload complete.")
+
+    def verify_ranges(self, address, filename, read_fn, ranges, chunk_size):
+        with open(filename, 'rb') as f:
+            file_data = f.read()
+        total = sum(size for offset, size in ranges)
+        self.log(f"Verifying {total} bytes of {filename} against 0x{address:08X}")
+        self.progress_start(total)
+        bytes_verified = 0
+        for offset, size in ranges:
+            for chunk_offset in range(offset, offset + size, chunk_size):
+                file_chunk = file_data[chunk_offset:min(chunk_offset + chunk_size, offset + size)]
+                if read_fn(address + chunk_offset, len(file_chunk)) != file_chunk:
+                    self.log(f"Verification FAILED at 0x{address + chunk_offset:08X}")
+                    raise ECUException("Verification failed!")
+                bytes_verified += len(file_chunk)
+                self.progress(bytes_verified)
+        self.log("Verification SUCCESSFUL!")
+        self.progress_end()
+
+    def verify_sampled(self, address, filename, read_fn, chunk_size, samples=8):
+        # Cheap second pass after a download: read again the first, the last
+        # and a random selection of chunks, with the same request sizes.
+        with open(filename, 'rb') as f:
+            file_data = f.read()
+        offsets = list(range(0, len(file_data), chunk_size))
+        if len(offsets) > samples:
+            offsets = sorted({offsets[0], offsets[-1]} | set(random.sample(offsets[1:-1], samples - 2)))
+        self.log(f"Verifying {len(offsets)} chunks of {filename} against 0x{address:08X}")
+        self.progress_start(len(offsets))
+        for i, offset in enumerate(offsets):
+            file_chunk = file_data[offset:offset+chunk_size]
+            if read_fn(address + offset, len(file_chunk)) != file_chunk:
+                self.log(f"Verification FAILED at 0x{address + offset:08X}")
+                raise ECUException("Verification failed!")
+            self.progress(i + 1)
+        self.log("Verification SUCCESSFUL!")
+        self.progress_end()
+
+
+class ConsoleProgress(FileTransfer):
+    """FileTransfer reporting to the console, for headless tools."""
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+
+    def log(self, msg):
+        if not self.quiet:
+            print(msg, flush=True)
+
+    def progress_start(self, total_steps):
+        pass
+
+    def progress(self, current_steps):
+        pass
+
+    def progress_end(self):
+        pass
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
 from threading import *
+from lib.busstats import delta
 
 please_select_file = "Please select a file:"
 bin_file = [("Raw binary file", "*.BIN *.bin *.cpt")]
@@ -66,3 +67,23 @@ class SelectCOM_widget(tk.LabelFrame):
 		self.prefs['COM']['port'] = port
 		return port
 
+
+class BusStats_widget(tk.LabelFrame):
+	def __init__(self, parent=None):
+		tk.LabelFrame.__init__(self, parent, text="Bus")
+		self.string_stats = tk.StringVar()
+		self.string_stats.set("-")
+		tk.Label(self, textvariable=self.string_stats, anchor=tk.W, justify=tk.LEFT).pack(fill=tk.X)
+		self.prev = None
+
+	def show(self, stats, sample_rate):
+		# Rates and latencies over the refresh interval, like sample_rate.
+		stats, self.prev = delta(stats, self.prev), stats
+		p50, p99 = stats['latency_p50'], stats['latency_p99']
+		latency = f"{p50*1000:.1f}/{p99*1000:.1f} ms" if(p50 != None) else "-"
+		timeout = f"{stats['answer_timeout']*1000:.1f} ms" if('answer_timeout' in stats) else "-"
+		self.string_stats.set(
+			f"Samples: {sample_rate:.1f}/s   Requests: {stats['requests_per_s']:.0f}/s   "
+			f"Bus load: {stats['bus_load']*100:.1f} %   Answer p50/p99: {latency}   "
+			f"Timeouts: {stats['timeouts']} ({timeout})   Retries: {stats['retries']}   Bad answers: {stats['dlc_errors']}"
+		)
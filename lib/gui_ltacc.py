@@ -1,35 +1,38 @@
-import os, re
+import os
 import tkinter as tk
 from tkinter import ttk, filedialog, simpledialog
 from lib.ltacc import LiveTuningAccess
+from lib.symmap import SymbolRegistry
 from lib.mock_ltacc import MockLiveTuningAccess
-from lib.gui_common import SelectCAN_widget, try_msgbox_decorator, bin_file
+from lib.gui_common import SelectCAN_widget, BusStats_widget, try_msgbox_decorator, bin_file
 from lib.gui_fileprogress import FileProgress_widget
 from lib.gui_tkmaptable import MapTableEditor, SimpleGauge
-import csv
+from lib.scheduler import ChannelScheduler
+from lib.acquisition import AcquisitionWorker
+from lib.channels import GAUGE_DEFINITIONS, bind_channels, channel_spans, ChannelCodec
+from lib.datalog import DataLogThread
+from lib.tables import TableAccess, load_tables, tables_filename
+from lib.maptable import CellStats
+import time
 
 # --- DEBUG MODE FLAG ---
 DEBUG_MODE = False # Set to True to enable debug mode without CAN connection
 
-# Some constants for calculated values
+# Some constants
 BO_BE = 'big'
-LSB_WEIGHT_FOR_RAW_MAF_TO_MG_STROKE = 0.25
-NUMBER_OF_CYLINDERS = 6
-CONVERSION_DIVISOR_FOR_GS = 120000.0
 
 CHARSET = 'ISO-8859-15'
 
-class SYMMap:
-    def __init__(self, file):
-        self.syms = {}
-        r = re.compile("^(.*) = (0x[0-9a-f]*);")
-        with open(file,'r') as f:
-            for line in f.readlines():
-                m = r.match(line)
-                if(m): self.syms[m.group(1)] = int(m.group(2), 16)
+# Size of the calibration block at cal_base
+CAL_SIZE = 0x3CB4
 
-    def get_sym_addr(self, symbol):
-        return self.syms[symbol]
+# (symbol, bytes zeroed) by the Zero STFT/LTFT and Zero dead time checkboxes
+FT0_RESETS = (
+    ("fueladaptB1A", 8), ("fueladaptB1B", 8), ("fueladaptB2A", 8), ("fueladaptB2B", 8),
+    ("stft_integratorB1", 2), ("stft_integratorB2", 2)
+)
+# A 16 bit trim like the STFT integrators (the original wrote 0 bytes).
+DT0_RESETS = (("LEA_ltft_idle_adj", 2),)
 
 class TunerWin(tk.Toplevel):
     def __init__(self, config, sym, lta, zeroscaler, impfn, expfn, fp_widget, parent=None, tuner_script_dir=None):
@@ -46,351 +49,69 @@ class TunerWin(tk.Toplevel):
         self.lta = lta
         self.update_id = None
 
-        self.speed = 0
-        self.load = 0
-
-        self.tunable_maps = ({
-            'xname': "rpm",
-            'read_xdata': lambda: [
-                int(v)*125//4+500 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Fuel_VolumetricEfficiencyBase_X_RPM"), 32
-                )
-            ],
-            'get_xvalue': lambda: self.speed,
-            'yname': "load",
-            'read_ydata': lambda: [
-                int(v)*4 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Fuel_VolumetricEfficiencyBase_Y_Load"), 32
-                )
-            ],
-            'get_yvalue': lambda: self.load,
-            'name': "Efficiency",
-            'read_data': lambda: [
-                [int(v)/2 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Fuel_VolumetricEfficiencyBase")+(i*32), 32
-                )] for i in range(0,32)
-            ],
-            'datafmt': "{:.1f}",
-            'step': 0.5,
-            'write_cell': lambda x,y,value:self.lta.write_memory(
-                self.sym.get_sym_addr("cal_Fuel_VolumetricEfficiencyBase")+(y*32)+x,
-                int(value*2).to_bytes(1, BO_BE)
-            ),
-            'xfmt': "{:.0f}",
-            'yfmt': "{:.0f}"
-        },{
-            'xname': "rpm",
-            'read_xdata': lambda: [
-                int(v)*125//4+500 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Load_AirmassTargetInitial_X_RPM"), 16
-                )
-            ],
-            'get_xvalue': lambda: self.speed,
-            'yname': "throttle",
-            'read_ydata': lambda: [
-                int(v)*4 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Load_AirmassTargetInitial_Y_Load"), 16
-                )
-            ],
-            'get_yvalue': lambda: self.load,
-            'name': "Airmass",
-            'read_data': lambda: [
-                [int(v)*4 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Load_AirmassTargetInitial")+(i*16), 16
-                )] for i in range(0,16)
-            ],
-            'datafmt': "{:.1f}",
-            'step': 0.5,
-            'write_cell': lambda x,y,value:self.lta.write_memory(
-                self.sym.get_sym_addr("cal_Load_AirmassTargetInitial")+(y*16)+x,
-                int(value/4).to_bytes(1, BO_BE)
-            ),
-            'xfmt': "{:.0f}",
-            'yfmt': "{:.0f}"
-        },{
-            'xname': "rpm",
-            'read_xdata': lambda: [
-                int(v)*125//4+500 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Ignition_TimingBaseSafetyManual_X_RPM"), 20
-                )
-            ],
-            'get_xvalue': lambda: self.speed,
-            'yname': "load",
-            'read_ydata': lambda: [
-                int(v)*4 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Ignition_TimingBaseSafetyManual_Y_Load"), 20
-                )
-            ],
-            'get_yvalue': lambda: self.load,
-            'name': "Ignition Safety",
-            'read_data': lambda: [
-                [int(v)/4-10 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Ignition_TimingBaseSafetyManual")+(i*20), 20
-                )] for i in range(0,20)
-            ],
-            'datafmt': "{:.1f}",
-            'step': 0.25,
-            'write_cell': lambda x,y,value:self.lta.write_memory(
-                self.sym.get_sym_addr("cal_Ignition_TimingBaseSafetyManual")+(y*20)+x,
-                int((value+10)*4).to_bytes(1, BO_BE)
-            ),
-            'xfmt': "{:.0f}",
-            'yfmt': "{:.0f}"
-        },{
-            'xname': "rpm",
-            'read_xdata': lambda: [
-                int(v)*125//4+500 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Ignition_TimingBaseMainManual_X_RPM"), 20
-                )
-            ],
-            'get_xvalue': lambda: self.speed,
-            'yname': "load",
-            'read_ydata': lambda: [
-                int(v)*4 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Ignition_TimingBaseMainManual_Y_Load"), 20
-                )
-            ],
-            'get_yvalue': lambda: self.load,
-            'name': "Ignition Main",
-            'read_data': lambda: [
-                [int(v)/4-10 for v in self.lta.read_memory(
-                    self.sym.get_sym_addr("cal_Ignition_TimingBaseMainManual")+(i*20), 20
-                )] for i in range(0,20)
-            ],
-            'datafmt': "{:.1f}",
-            'step': 0.25,
-            'write_cell': lambda x,y,value:self.lta.write_memory(
-                self.sym.get_sym_addr("cal_Ignition_TimingBaseMainManual")+(y*20)+x,
-                int((value+10)*4).to_bytes(1, BO_BE)
-            ),
-            'xfmt': "{:.0f}",
-            'yfmt': "{:.0f}"
-        })
-
-        # Define gauges
-        self.gauge_definitions = ({
-            'name': "Engine Speed",
-            'fmt': "{:.0f} rpm",
-            'low': 0,
-            'high': 7500,
-            'read_data': lambda: self.speed
-        },{
-            'name': "Engine Load",
-            'fmt': "{:.0f} mg/str.",
-            'low': 60,
-            'high': 864,
-            'read_data': lambda: self.load
-        },{
-            'name': "Coolant",
-            'fmt': "{:.1f} °C",
-            'low': 20,
-            'high': 110,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("coolant"), 1), BO_BE)*5/8-40
-        },{
-            'name': "Intake Air",
-            'fmt': "{:.1f} °C",
-            'low': 20,
-            'high': 70,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("air"), 1), BO_BE)*5/8-40
-        },{
-            'name': "MAF",
-            'fmt': "{:.1f} g/s",
-            'low': 0,
-            'high': 300,
-            'read_data': lambda: (
-                (
-                    int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("MAF"), 2), BO_BE)
-                    * LSB_WEIGHT_FOR_RAW_MAF_TO_MG_STROKE
-                )
-                * self.speed
-                * NUMBER_OF_CYLINDERS
-            ) / CONVERSION_DIVISOR_FOR_GS
-        },{
-            'name': "TPS",
-            'fmt': "{:.1f} %",
-            'low': 0,
-            'high': 100,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("TPS"), 2), BO_BE)*100/1023
-        },{
-            'name': "Pedal",
-            'fmt': "{:.1f} %",
-            'low': 0,
-            'high': 100,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("PPS"), 2), BO_BE)*100/1023
-        },{
-            'name': "Tip In",
-            'fmt': "{:.1f} us",
-            'low': 0,
-            'high': 900,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("tipin"), 1), BO_BE)/255
-        },{
-            'name': "Pulse Width Bank 1",
-            'fmt': "{:d} us",
-            'low': 0,
-            'high': 15000,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("pulsewidth_b1"), 2), BO_BE)
-        },{
-            'name': "Pulse Width Bank 2",
-            'fmt': "{:d} us",
-            'low': 0,
-            'high': 15000,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("pulsewidth_b2"), 2), BO_BE)
-        },{
-            'name': "O2 Voltage Bank 1",
-            'fmt': "{:.2f} v",
-            'low': 0,
-            'high': 15000,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("nbo2_b1"), 2), BO_BE)*5/16383
-        },{
-            'name': "O2 Voltage Bank 2",
-            'fmt': "{:.2f} v",
-            'low': 0,
-            'high': 15000,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("nbo2_b2"), 2), BO_BE)*5/16383
-        },{
-            'name': "STFT Bank 1",
-            'fmt': "{:.1f} %",
-            'low': -10,
-            'high': 10,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("stft_b1"), 2), BO_BE, signed=True)/20
-        },{
-            'name': "STFT Bank 2",
-            'fmt': "{:.1f} %",
-            'low': -10,
-            'high': 10,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("stft_b2"), 2), BO_BE, signed=True)/20
-        },{
-            'name': "LTFT Bank 1",
-            'fmt': "{:.1f} %",
-            'low': -10,
-            'high': 10,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ltft_b1"), 2), BO_BE, signed=True)/20
-        },{
-            'name': "LTFT Bank 2",
-            'fmt': "{:.1f} %",
-            'low': -10,
-            'high': 10,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ltft_b2"), 2), BO_BE, signed=True)/20
-        },{
-            'name': "Target AFR",
-            'fmt': "{:.2f} AFR",
-            'low': 10,
-            'high': 20,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("afr_target"), 2), BO_BE)/100
-        },{
-            'name': "Gear",
-            'fmt': "{:d} #",
-            'low': 0,
-            'high': 6,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("gear"), 2), BO_BE)
-        },{
-            'name': "Ign 1",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: 387.5 - int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ign_1"), 2), 'big', signed=True) / 4.0
-        },{
-            'name': "Ign 2",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: 687.5 - int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ign_2"), 2), BO_BE, signed=True) / 4.0
-        },{
-            'name': "Ign 3",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: 987.5 - int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ign_3"), 2), 'big', signed=True) / 4.0
-        },{
-            'name': "Ign 4",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: 1287.5 - int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ign_4"), 2), 'big', signed=True) / 4.0
-        },{
-            'name': "Ign 5",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: 1587.5 - int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ign_5"), 2), 'big', signed=True) / 4.0
-        },{
-            'name': "Ign 6",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: 87.5 - int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("ign_6"), 2), 'big', signed=True) / 4.0
-        },{
-            'name': "KR 1",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("kr_1"), 1), BO_BE, signed=True)/4
-        },{
-            'name': "KR 2",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("kr_2"), 1), BO_BE, signed=True)/4
-        },{
-            'name': "KR 3",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("kr_3"), 1), BO_BE, signed=True)/4
-        },{
-            'name': "KR 4",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("kr_4"), 1), BO_BE, signed=True)/4
-        },{
-            'name': "KR 5",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("kr_5"), 1), BO_BE, signed=True)/4
-        },{
-            'name': "KR 6",
-            'fmt': "{:.2f} °",
-            'low': -10,
-            'high': 50,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("kr_6"), 1), BO_BE, signed=True)/4
-        },{
-            'name': "Battery Voltage",
-            'fmt': "{:.2f} v",
-            'low': 8,
-            'high': 18,
-            'read_data': lambda: int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("vbat"), 1), BO_BE)*7/64
-        })
+        # Each live channel is polled at its own rate, in a few buffer reads
+        # per tick.
+        self.gauge_definitions = GAUGE_DEFINITIONS
+        self.channels = bind_channels(self.gauge_definitions, self.sym)
+        # Trim resets written on every tick while ticked, resolved once.
+        self.ft0_writes = self.resolve_resets(FT0_RESETS)
+        self.dt0_writes = self.resolve_resets(DT0_RESETS)
+        self.codec = ChannelCodec(self.channels)
+        self.scheduler = ChannelScheduler(channel_spans(self.gauge_definitions, self.sym))
+        self.live_values = {}
+        self.live_seq = 0
+        self.hit_seq = 0
+        # From here on, the bus belongs to the acquisition worker.
+        self.acq = AcquisitionWorker(self.lta, self.scheduler, self.scheduler.period)
+
+        # Tables come from the .tables file next to the sym file. An editor
+        # (and its bulk reads) is only built when its tab is first opened.
+        self.tables = [
+            TableAccess(t, self.sym, self.acq, lambda: self.verify_writes.get())
+            for t in load_tables(tables_filename(self.sym.file))
+        ]
+        # Cell hits of every table, counted from the start whether its tab
+        # was opened or not, and shown by the editors.
+        self.hits = [CellStats(t.axes_model()) for t in self.tables]
 
         f_vertical = tk.Frame(self)
         f_vertical.pack(side=tk.LEFT)
         self.tabControl = ttk.Notebook(f_vertical)
-        self.m = []
-        for t in self.tunable_maps:
-            m = MapTableEditor(self.tabControl, **t)
-            m.pack()
-            self.m.append(m)
-            self.tabControl.add(m, text=t['name'])
+        self.m = [None] * len(self.tables)
+        self.tab_frames = []
+        for t in self.tables:
+            frame = tk.Frame(self.tabControl)
+            self.tabControl.add(frame, text=t.table['name'])
+            self.tab_frames.append(frame)
+        self.stale = set()
+        self.tabControl.bind('<<NotebookTabChanged>>', self.on_tab_changed)
         self.tabControl.pack()
+        # The first table is built once the window is shown.
+        self.after_idle(self.on_tab_changed)
 
         # Actions
         f_action = tk.LabelFrame(f_vertical, highlightthickness=2, text="Actions")
         f_action.pack(fill=tk.X)
         self.force_ft0 = tk.IntVar()
-        tk.Checkbutton(f_action, text='Zero STFT/LTFT',variable=self.force_ft0).pack(side=tk.LEFT)
+        tk.Checkbutton(f_action, text='Zero STFT/LTFT',variable=self.force_ft0,
+            state=tk.NORMAL if(self.ft0_writes != None) else tk.DISABLED).pack(side=tk.LEFT)
         self.force_dt0 = tk.IntVar()
-        tk.Checkbutton(f_action, text='Zero dead time',variable=self.force_dt0).pack(side=tk.LEFT)
-        tk.Button(f_action, text="Zero Ign. Scaler", command=zeroscaler).pack(side=tk.LEFT)
+        tk.Checkbutton(f_action, text='Zero dead time',variable=self.force_dt0,
+            state=tk.NORMAL if(self.dt0_writes != None) else tk.DISABLED).pack(side=tk.LEFT)
+        self.verify_writes = tk.IntVar()
+        tk.Checkbutton(f_action, text='Verify writes',variable=self.verify_writes).pack(side=tk.LEFT)
+        # zeroscaler is None without the scaler symbol.
+        tk.Button(f_action, text="Zero Ign. Scaler", command=self.zeroscaler,
+            state=tk.NORMAL if(zeroscaler != None) else tk.DISABLED).pack(side=tk.LEFT)
         tk.Button(f_action, text="Import", command=self.impcal).pack(side=tk.LEFT)
         tk.Button(f_action, text="Export", command=self.expcal).pack(side=tk.LEFT)
+        self.zerofn = zeroscaler
         self.impfn = impfn
         self.expfn = expfn
 
         # LOGGING BUTTON AND VARIABLES
         self.is_logging_active = False
-        self.log_file = None
-        self.csv_writer = None
+        self.log_writer = None
         self.log_directory = tuner_script_dir
         os.makedirs(self.log_directory, exist_ok=True)
 
@@ -398,6 +119,12 @@ class TunerWin(tk.Toplevel):
         self.log_button.pack(side=tk.LEFT)
         self.default_button_color = self.log_button.cget('bg')
 
+        # Transport statistics, refreshed every second
+        self.bus_stats = BusStats_widget(f_vertical)
+        self.bus_stats.pack(fill=tk.X)
+        self.stats_time = time.perf_counter()
+        self.stats_seq = 0
+
         # Live Variables
         f_live_container = tk.LabelFrame(self, highlightthickness=2, text="Live-Data")
         f_live_container.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5,0))
@@ -431,34 +158,37 @@ class TunerWin(tk.Toplevel):
                 parent_frame_for_gauge = column2_frame
                 current_row_in_column = i - gauges_in_first_column
 
-            gauge_widget = SimpleGauge(parent_frame_for_gauge, **g_props)
+            gauge_widget = SimpleGauge(
+                parent_frame_for_gauge, g_props['name'], g_props['fmt'], g_props['low'], g_props['high'],
+                lambda name=g_props['name']: self.live_values[name]
+            )
 
             gauge_widget.grid(row=current_row_in_column, column=0, sticky="ew", pady=1)
 
             self.l.append(gauge_widget)
 
+        self.acq.start()
         self.after_loop()
 
     def _get_unique_log_filename(self, base_name="live_data"):
-        """Generates a unique filename for the log CSV."""
+        """Generates a unique filename for the binary datalog."""
         i = 1
         while True:
-            filename = os.path.join(self.log_directory, f"{base_name}_{i:03d}.csv")
+            filename = os.path.join(self.log_directory, f"{base_name}_{i:03d}.bin")
             if not os.path.exists(filename):
                 return filename
             i += 1
 
     @try_msgbox_decorator
     def toggle_logging(self):
-        """Toggles logging of gauge data to a CSV file."""
+        """Toggles logging of gauge data to a binary datalog (see lib/datalog.py for CSV)."""
         if not self.is_logging_active:
             try:
                 log_filename = self._get_unique_log_filename()
-                self.log_file = open(log_filename, 'w', newline='', encoding='utf-8')
-                self.csv_writer = csv.writer(self.log_file)
-
-                header = [g['name'] for g in self.gauges_info]
-                self.csv_writer.writerow(header)
+                # Every acquired sample goes to the writer thread.
+                self.log_writer = DataLogThread(log_filename, self.channels)
+                self.log_writer.start()
+                self.acq.add_listener(self.log_writer.put)
 
                 self.is_logging_active = True
                 self.log_button.config(bg='green', text="Stop Log")
@@ -470,10 +200,10 @@ class TunerWin(tk.Toplevel):
                 self.fp_widget.log(f"Error starting log: {e}")
                 raise
         else:
-            if self.log_file:
-                self.log_file.close()
-                self.log_file = None
-                self.csv_writer = None
+            if self.log_writer:
+                self.acq.remove_listener(self.log_writer.put)
+                self.log_writer.close()
+                self.log_writer = None
             self.is_logging_active = False
             self.log_button.config(bg=self.default_button_color, text="Log")
             self.title("Tuner")
@@ -486,42 +216,59 @@ class TunerWin(tk.Toplevel):
         if not self.is_running:
             return
 
-        try:
-            self.speed = int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("engine_speed"), 2), BO_BE)/4
-            self.load = int.from_bytes(self.lta.read_memory(self.sym.get_sym_addr("engine_load"), 2), BO_BE)
-        except Exception as e:
-            self.fp_widget.log(f"Error reading live data: {e}")
-
-        for m in self.m: m.update()
+        # Only render the newest snapshot, the bus is polled by self.acq.
+        snap = self.acq.get_latest()
+        if(snap != None and snap.seq != self.live_seq):
+            self.live_seq = snap.seq
+            if(snap.error != None):
+                self.live_values = {}
+                self.fp_widget.log(f"Error reading live data: {snap.error}")
+            else:
+                self.live_values = self.codec.decode(snap.image)
+
+        # Every snapshot since the last tick counts in the cell hits.
+        snaps = [s for s in self.acq.get_history(self.hit_seq) if(s.error == None)]
+        if(snaps):
+            self.hit_seq = snaps[-1].seq
+            raw, values = self.codec.decode_many([s.image for s in snaps])
+            for t, stats in zip(self.tables, self.hits):
+                x, y = t.table['x']['live'], t.table['y']['live']
+                if(x in values and y in values): stats.add(values[x], values[y])
+
+        # Only the visible table follows the cursor, hidden ones catch up
+        # when selected.
+        m = self.m[self.tabControl.index('current')]
+        if(m): m.update()
         for l in self.l: l.update()
 
+        now = time.perf_counter()
+        if(now - self.stats_time >= 1.0):
+            self.bus_stats.show(self.lta.get_stats(), (self.live_seq - self.stats_seq) / (now - self.stats_time))
+            self.stats_time, self.stats_seq = now, self.live_seq
+
+        # Queued, sent by the worker between two ticks.
         if(self.force_ft0.get()):
-            self.lta.write_memory(self.sym.get_sym_addr("fueladaptB1A"), b'\x00\x00\x00\x00\x00\x00\x00\x00')
-            self.lta.write_memory(self.sym.get_sym_addr("fueladaptB1B"), b'\x00\x00\x00\x00\x00\x00\x00\x00')
-            self.lta.write_memory(self.sym.get_sym_addr("fueladaptB2A"), b'\x00\x00\x00\x00\x00\x00\x00\x00')
-            self.lta.write_memory(self.sym.get_sym_addr("fueladaptB2B"), b'\x00\x00\x00\x00\x00\x00\x00\x00')
-            self.lta.write_memory(self.sym.get_sym_addr("stft_integratorB1"), b'\x00\x00')
-            self.lta.write_memory(self.sym.get_sym_addr("stft_integratorB2"), b'\x00\x00')
+            for address, data in self.ft0_writes:
+                self.acq.write_memory(address, data)
         if(self.force_dt0.get()):
-            self.lta.write_memory(self.sym.get_sym_addr("LEA_ltft_idle_adj"), b'')
+            for address, data in self.dt0_writes:
+                self.acq.write_memory(address, data)
+        if(self.acq.write_error != None):
+            self.fp_widget.log(f"Write failed: {self.acq.write_error}")
+            self.acq.write_error = None
 
-        # Log data if active
-        if self.is_logging_active and self.csv_writer:
-            row_data = []
-            for gauge_widget in self.l:
-                try:
-                    row_data.append(gauge_widget.get_value())
-                except Exception as e:
-                    print(f"Error reading gauge data for logging: {gauge_widget.cget('text')}: {e}")
-                    row_data.append(None)
-            try:
-                self.csv_writer.writerow(row_data)
-            except Exception as e:
-                self.fp_widget.log(f"Error writing to log file: {e}. Stopping logging.")
-                self.toggle_logging()
+        if self.is_logging_active and self.log_writer.error:
+            self.fp_widget.log(f"Error writing to log file: {self.log_writer.error}. Stopping logging.")
+            self.toggle_logging()
 
         self.update_id = self.after(100, self.after_loop) # Update every 100ms
 
+    def resolve_resets(self, resets):
+        # (address, zeros) of every reset, None if the firmware lacks a symbol.
+        writes = [(self.sym.syms.get(s), bytes(n)) for s, n in resets]
+        if(any(address == None for address, data in writes)): return None
+        return writes
+
     @try_msgbox_decorator
     def impcal(self):
         answer = filedialog.askopenfilename(
@@ -533,8 +280,16 @@ class TunerWin(tk.Toplevel):
         )
         if(answer):
             self.config['PATH']['bin'] = os.path.dirname(answer)
-            self.impfn(answer)
-            for m in self.m: m.reload()
+            with self.acq.exclusive():
+                self.impfn(answer)
+            # The axes may have changed, hits restart.
+            for t, stats in zip(self.tables, self.hits):
+                stats.model = t.axes_model()
+                stats.clear()
+            # Reload the visible table now, the other built ones when shown.
+            i = self.tabControl.index('current')
+            self.stale = set(j for j, m in enumerate(self.m) if(m and j != i))
+            if(self.m[i]): self.m[i].reload()
 
     @try_msgbox_decorator
     def expcal(self):
@@ -547,11 +302,32 @@ class TunerWin(tk.Toplevel):
         )
         if(answer):
             self.config['PATH']['bin'] = os.path.dirname(answer)
-            self.expfn(answer)
+            with self.acq.exclusive():
+                self.expfn(answer)
+
+    @try_msgbox_decorator
+    def zeroscaler(self):
+        with self.acq.exclusive():
+            self.zerofn()
+
+    @try_msgbox_decorator
+    def on_tab_changed(self, event=None):
+        i = self.tabControl.index('current')
+        if(i in self.stale):
+            self.stale.discard(i)
+            self.m[i].reload()
+        if(self.m[i] != None):
+            self.m[i].update()
+            return
+        t = self.tables[i]
+        live = lambda axis: (lambda: self.live_values.get(t.table[axis]['live'], 0))
+        self.m[i] = MapTableEditor(self.tab_frames[i], stats=self.hits[i], **t.editor_args(live('x'), live('y')))
+        self.m[i].pack()
 
     @try_msgbox_decorator
     def onKeyPress(self, event):
         i = self.tabControl.index('current')
+        if(self.m[i] == None): return
         if  (event.char == 'q'): self.m[i].inc_cur()
         elif(event.char == 'a'): self.m[i].dec_cur()
         elif(event.char == '+'): self.m[i].inc_sel()
@@ -567,12 +343,13 @@ class TunerWin(tk.Toplevel):
         if self.update_id:
             self.after_cancel(self.update_id)
             self.update_id = None
+        self.acq.stop()
 
-        if self.is_logging_active and self.log_file:
-            self.log_file.close()
+        if self.is_logging_active and self.log_writer:
+            self.acq.remove_listener(self.log_writer.put)
+            self.log_writer.close()
             self.is_logging_active = False
-            self.log_file = None
-            self.csv_writer = None
+            self.log_writer = None
 
         self.destroy()
 
@@ -642,20 +419,32 @@ class LiveTuningAccess_win(tk.Toplevel):
     @try_msgbox_decorator
     @lta_decorator
     def tuner(self, lta):
-        sym = SYMMap("patch/t6eP138.sym")
+        patch_dir = os.path.join(self.tuner_script_dir or "", "patch")
+        registry = SymbolRegistry(patch_dir)
 
         if isinstance(lta, MockLiveTuningAccess):
-            lta.set_sym_map(sym)
-            lta.load_sram_content("patch/calramidle")
+            # The mock pretends to run the first known firmware.
+            lta.set_sym_map(registry.get(registry.ids()[0]))
+            lta.load_sram_content(os.path.join(patch_dir, "calramidle"))
 
-        if(lta.read_memory(sym.get_sym_addr("cal_base"), 4) != b"P138"):
+        sym = registry.identify(lta)
+        if(sym == None):
             raise Exception("Unsupported ECU! Contact me!")
+        self.fp.log(f"Firmware {os.path.basename(sym.file)}")
+
+        # Resolved once, the callbacks below run for the whole session.
+        cal_base = sym.get_sym_addr("cal_base")
+        # Optional, the button is disabled if the firmware lacks it.
+        timing_trim = sym.syms.get("rt_PerCylinder_AdaptiveTimingTrim")
+
+        # Tables and exports are then served from memory.
+        lta.load_shadow(cal_base, CAL_SIZE)
 
         tw = TunerWin(
             self.config, sym, lta,
-            lambda: lta.write_memory(sym.get_sym_addr("rt_PerCylinder_AdaptiveTimingTrim"), b'\x00\x00\x00\x00\x00\x00\x00\x00'),
-            lambda f: lta.upload_verify(sym.get_sym_addr("cal_base"), f),
-            lambda f: lta.download_verify(sym.get_sym_addr("cal_base"), 0x3CB4, f),
+            (lambda: lta.write_memory(timing_trim, b'\x00\x00\x00\x00\x00\x00\x00\x00')) if(timing_trim != None) else None,
+            lambda f: lta.upload_verify(cal_base, f),
+            lambda f: lta.download_verify(cal_base, CAL_SIZE, f),
             self.fp,
             self,
             self.tuner_script_dir
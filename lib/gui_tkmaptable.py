@@ -1,21 +1,33 @@
 import colorsys
+import time
 import tkinter as tk
 from tkinter import ttk
+from lib.maptable import TableModel, CellStats, OPERATIONS
 
 def hls_to_hex(h,l,s):
 	r, g, b = [int(x * 255) for x in colorsys.hls_to_rgb(h,l,s)]
 	return f'#{r:02X}{g:02X}{b:02X}'
 
+# Cell colors from the lowest (blue) to the highest (red) value of a table
+COLOR_LUT = [hls_to_hex(0.7-0.7*i/255, 0.8, 0.5) for i in range(256)]
+
+# Cell hit overlay, from never visited (white) to the most visited cell
+HEAT_LUT = [hls_to_hex(0.08, 1.0-0.5*i/63, 1.0) for i in range(64)]
+HEAT_PERIOD = 1.0 # Seconds between two overlay repaints
+
 class MapTable(tk.Canvas):
 	CELLW=32
 	CELLH=16
 
-	def __init__(self, parent, xname, read_xdata, yname, read_ydata, name, read_data, write_cell=lambda x,y,value:None, xfmt="{:d}", yfmt="{:d}", datafmt="{:d}"):
-		self.xdata = read_xdata()
-		self.ydata = read_ydata()
-		self.data = read_data()
-		self.xsize=len(self.xdata)
-		self.ysize=len(self.ydata)
+	def __init__(self, parent, xname, read_xdata, yname, read_ydata, name, read_data, write_cell=lambda x,y,value:None, xfmt="{:d}", yfmt="{:d}", datafmt="{:.0f}", write_row=None, quantize=None, stats=None):
+		if(write_row == None):
+			write_row = lambda x,y,values: [write_cell(x+i, y, v) for i, v in enumerate(values)]
+		self.model = TableModel(read_xdata(), read_ydata(), read_data(), write_row, quantize)
+		self.xdata = self.model.xdata
+		self.ydata = self.model.ydata
+		self.data = self.model.data
+		self.xsize = self.model.xsize
+		self.ysize = self.model.ysize
 		tk.Canvas.__init__(self, parent, width=(self.xsize+1)*self.CELLW, height=(self.ysize+1)*self.CELLH)
 		self.create_line(0, 0, self.CELLW, self.CELLH)
 		self.create_text(self.CELLW, 2, anchor=tk.NE, justify=tk.RIGHT, text=xname, font=('Helvetica 6'))
@@ -35,19 +47,39 @@ class MapTable(tk.Canvas):
 		self.xfmt = xfmt
 		self.yfmt = yfmt
 		self.datafmt = datafmt
+		# LUT index of every cell fill, the (min, max) it was computed for
+		# and the cells modified since, see color_cells()
+		self.cell_colors = [[None] * self.xsize for _ in range(self.ysize)]
+		self.color_range = None
+		self.dirty = set()
+		# Time spent around every cell, shown instead of the values when
+		# heat_shown, see draw_heat(). Given stats (over the same axes) are
+		# filled by their owner, even before the editor exists.
+		self.stats = stats if(stats != None) else CellStats(self.model)
+		self.heat_shown = False
+		self.heat_time = 0
 		self.interpolation = (0, 0, 0, 0, ((1.0, 0.0),(0.0, 0.0)), 0.0)
-		self.cursor = ()
-		self.selection = [0, 0, 0, 0, None, False]
-		self.write_cell = write_cell
+		# The overlays are created once, hidden, and only moved afterwards.
+		self.cursor = (
+			self.create_rectangle(0, 0, 0, 0, outline='red', width=4, state=tk.HIDDEN),
+			self.create_line(0, 0, 0, 0, fill="red", width=2, state=tk.HIDDEN),
+			self.create_line(0, 0, 0, 0, fill="red", width=2, state=tk.HIDDEN),
+			self.create_line(0, 0, 0, 0, fill="red", width=2, state=tk.HIDDEN),
+			self.create_line(0, 0, 0, 0, fill="red", width=2, state=tk.HIDDEN)
+		)
+		self.cursor_drawn = None
+		self.selection = [0, 0, 0, 0, self.create_rectangle(0, 0, 0, 0, outline='blue', width=4, state=tk.HIDDEN), False]
+		self.selection_drawn = (0, 0, 0, 0)
 		self.bind("<Button-1>", self.on_left_click)
 		self.bind("<Button-3>", self.on_right_click)
 		self.bind('<Motion>', self.on_motion)
 		self.bind('<ButtonRelease>', self.on_release)
 
 	def reload(self):
-		self.xdata = self.read_xdata()
-		self.ydata = self.read_ydata()
-		self.data = self.read_data()
+		self.model.load(self.read_xdata(), self.read_ydata(), self.read_data())
+		self.xdata = self.model.xdata
+		self.ydata = self.model.ydata
+		self.data = self.model.data
 		for x in range(0,self.xsize):
 			self.itemconfigure(self.xaxis[x], text=self.xfmt.format(self.xdata[x]))
 		for y in range(0,self.ysize):
@@ -55,90 +87,123 @@ class MapTable(tk.Canvas):
 		for y in range(0,self.ysize):
 			for x in range(0,self.xsize):
 				self.itemconfigure(self.cells[y][x][1], text=self.datafmt.format(self.data[y][x]))
+		self.color_range = None
+		if(self.stats.model is self.model): self.stats.clear()
+		self.heat_time = 0
+
+	def cell_range(self):
+		# (min, max) of the cells, from the last range and the cells modified
+		# since. Only a cell that held an extreme (LUT index 0 or top) and
+		# moved inward forces a full scan.
+		if(self.color_range == None): return self.model.range()
+		low, high = self.color_range
+		top = len(COLOR_LUT)-1
+		new_low, new_high = low, high
+		for x, y in self.dirty:
+			v = float(self.data[y][x])
+			c = self.cell_colors[y][x]
+			if((c == 0 and v > low) or (c == top and v < high)): return self.model.range()
+			new_low, new_high = min(new_low, v), max(new_high, v)
+		return new_low, new_high
 
 	def color_cells(self):
-		min = max = self.data[0][0]
-		for y in range(0,self.ysize):
-			for x in range(0,self.xsize):
-				if(self.data[y][x] < min): min = self.data[y][x]
-				if(self.data[y][x] > max): max = self.data[y][x]
-		q = (max-min)/0.7
-		if(q == 0): return # No coloration if all cells are identical.
+		if(self.heat_shown): return # Recolored when the overlay is hidden.
+		low, high = self.cell_range()
+		if(high == low): # No coloration if all cells are identical.
+			self.color_range = None
+			return
+		if((low, high) != self.color_range):
+			# The range moved, every cell may change color.
+			self.color_range = (low, high)
+			cells = [(x, y) for y in range(0,self.ysize) for x in range(0,self.xsize)]
+		else:
+			cells = self.dirty
+		self.dirty = set()
+		q = (len(COLOR_LUT)-1)/(high-low)
+		for x, y in cells:
+			c = round((self.data[y][x]-low)*q)
+			if(c != self.cell_colors[y][x]):
+				self.cell_colors[y][x] = c
+				self.itemconfigure(self.cells[y][x][0], fill=COLOR_LUT[c])
+
+	def show_heat(self, shown):
+		self.heat_shown = shown
+		# Every cell fill changes, forget the colors on screen.
+		self.cell_colors = [[None] * self.xsize for _ in range(self.ysize)]
+		self.color_range = None
+		self.heat_time = 0
+		if(shown):
+			self.draw_heat()
+			return
+		low, high = self.model.range()
+		if(high == low): # Back to the plain cells of an uncolored table.
+			for y in range(0,self.ysize):
+				for x in range(0,self.xsize):
+					self.itemconfigure(self.cells[y][x][0], fill='white')
+		self.color_cells()
+
+	def draw_heat(self):
+		# Throttled, only the cells that changed shade are refilled.
+		now = time.perf_counter()
+		if(not self.heat_shown or now - self.heat_time < HEAT_PERIOD): return
+		self.heat_time = now
+		weights = self.stats.rows(self.stats.weight)
+		high = max(max(row) for row in weights)
+		q = (len(HEAT_LUT)-1)/high if(high > 0) else 0
 		for y in range(0,self.ysize):
 			for x in range(0,self.xsize):
-				self.itemconfigure(self.cells[y][x][0], fill=hls_to_hex(0.7-((self.data[y][x]-min)/q), 0.8, 0.5))
+				c = round(weights[y][x]*q)
+				if(c != self.cell_colors[y][x]):
+					self.cell_colors[y][x] = c
+					self.itemconfigure(self.cells[y][x][0], fill=HEAT_LUT[c])
 
 	def draw_cursor(self):
-		for i in self.cursor: self.delete(i)
 		cx, cy, x2r, y2r, m, res = self.interpolation
 		px=self.CELLW*(cx+1)
 		py=self.CELLH*(cy+1)
-		px2=px+self.CELLW*(x2r+0.5)
-		py2=py+self.CELLH*(y2r+0.5)
+		px2=round(px+self.CELLW*(x2r+0.5))
+		py2=round(py+self.CELLH*(y2r+0.5))
 		width=self.CELLW*min(self.xsize-cx, 2)
 		heigth=self.CELLH*min(self.ysize-cy, 2)
-		self.cursor = (
-			self.create_rectangle(px, py, px+width, py+heigth, outline='red', width=4),
-			self.create_line(px2, self.CELLH, px2, py, fill="red", width=2),
-			self.create_line(self.CELLW, py2, px, py2, fill="red", width=2),
-			self.create_line(px2, py+heigth, px2, (self.ysize+1)*self.CELLH, fill="red", width=2),
-			self.create_line(px+width, py2, (self.xsize+1)*self.CELLW, py2, fill="red", width=2)
+		coords = (
+			(px, py, px+width, py+heigth),
+			(px2, self.CELLH, px2, py),
+			(self.CELLW, py2, px, py2),
+			(px2, py+heigth, px2, (self.ysize+1)*self.CELLH),
+			(px+width, py2, (self.xsize+1)*self.CELLW, py2)
 		)
+		# Nothing to do while the cursor stays on the same pixels.
+		if(coords == self.cursor_drawn): return
+		for i, c in zip(self.cursor, coords): self.coords(i, *c)
+		if(self.cursor_drawn == None):
+			for i in self.cursor: self.itemconfigure(i, state=tk.NORMAL)
+		self.cursor_drawn = coords
 
 	def draw_selection(self):
-		if(self.selection[4]): self.delete(self.selection[4])
-		if(self.selection[0:4] == [0,0,0,0]): return
+		if(self.selection[0:4] == list(self.selection_drawn)): return
+		self.selection_drawn = tuple(self.selection[0:4])
+		if(self.selection[0:4] == [0,0,0,0]):
+			self.itemconfigure(self.selection[4], state=tk.HIDDEN)
+			return
 		px=self.CELLW*(self.selection[0]+1)
 		py=self.CELLH*(self.selection[1]+1)
 		px2=self.CELLW*(self.selection[2]+1)
 		py2=self.CELLH*(self.selection[3]+1)
-		self.selection[4] = self.create_rectangle(px, py, px2, py2, outline='blue', width=4)
+		self.coords(self.selection[4], px, py, px2, py2)
+		self.itemconfigure(self.selection[4], state=tk.NORMAL)
 
 	def do_interpolation(self, xvalue, yvalue):
-		# Find X and Y cell
-		cx = cy = 0
-		while(cx+1 < self.xsize and self.xdata[cx] == self.xdata[cx+1]):
-			cx = cx + 1;
-		for x in range(cx,self.xsize):
-			if(xvalue >= self.xdata[x]): cx = x
-			else: break
-		while(cy+1 < self.ysize and self.ydata[cy] == self.ydata[cy+1]):
-			cy = cy + 1;
-		for y in range(cy,self.ysize):
-			if(yvalue >= self.ydata[y]): cy = y
-			else: break
-
-		# Interpolation ratio
-		x2r = y2r = 0.0
-		if(cx+1 < self.xsize):
-			step = self.xdata[cx+1]-self.xdata[cx]
-			diff = xvalue-self.xdata[cx]
-			if(diff > 0): x2r = diff/step
-		if(cy+1 < self.ysize):
-			step = self.ydata[cy+1]-self.ydata[cy]
-			diff = yvalue-self.ydata[cy]
-			if(diff > 0): y2r = diff/step
-		x1r = 1.0 - x2r
-		y1r = 1.0 - y2r
-		m = ((y1r*x1r, y1r*x2r), (y2r*x1r, y2r*x2r))
-
-		# Compute result value with interpolation
-		res = 0.0
-		for y in range(0, 2):
-			for x in range(0, 2):
-				# Avoid index out of bound, by checking m !
-				if(m[y][x] != 0.0):
-					res += self.data[cy+y][cx+x]*m[y][x]
-
-		# Save all
-		self.interpolation = (cx, cy, x2r, y2r, m, res)
+		self.interpolation = self.model.interpolate(xvalue, yvalue)
 
 	def modify_cell(self, x, y, value):
 		if(x < self.xsize and y < self.ysize):
-			self.data[y][x] += value
+			# Same path as the bulk operations: added to the exact value,
+			# quantized (the screen shows what the ECU stores), then written
+			# as a one cell row if it changed.
+			self.model.put_region(x, y, [[self.model.exact[y][x] + value]])
+			self.dirty.add((x, y))
 			self.itemconfigure(self.cells[y][x][1],
 				text=self.datafmt.format(self.data[y][x]))
-			self.write_cell(x,y,self.data[y][x])
 
 	def modify_cursor(self, value, algo=0):
 		cx, cy, x2r, y2r, m, res = self.interpolation
@@ -161,10 +226,16 @@ class MapTable(tk.Canvas):
 			self.modify_cell(cx+mx, cy+my, value)
 		self.color_cells()
 
-	def modify_selection(self, value):
-		for y in range(self.selection[1], self.selection[3]):
-			for x in range(self.selection[0], self.selection[2]):
-				self.modify_cell(x, y, value)
+	def modify_selection(self, value, op="offset"):
+		# A TableModel bulk operation (see maptable.OPERATIONS), one write
+		# per row of the selection.
+		x1, y1, x2, y2 = self.model.clip(*self.selection[0:4])
+		getattr(self.model, op)(x1, y1, x2, y2, value)
+		for y in range(y1, y2):
+			for x in range(x1, x2):
+				self.dirty.add((x, y))
+				self.itemconfigure(self.cells[y][x][1],
+					text=self.datafmt.format(self.data[y][x]))
 		self.color_cells()
 
 	def on_left_click(self, event):
@@ -190,7 +261,7 @@ class MapTable(tk.Canvas):
 		self.selection[5] = False
 
 class MapTableEditor(tk.Frame):
-	def __init__(self, parent, xname, read_xdata, get_xvalue, yname, read_ydata, get_yvalue, name, read_data, write_cell=lambda x,y,value:None, xfmt="{:d}", yfmt="{:d}", datafmt="{:d}", step=1.0):
+	def __init__(self, parent, xname, read_xdata, get_xvalue, yname, read_ydata, get_yvalue, name, read_data, write_cell=lambda x,y,value:None, xfmt="{:d}", yfmt="{:d}", datafmt="{:.0f}", step=1.0, write_row=None, quantize=None, stats=None):
 		tk.Frame.__init__(self, parent)
 		vcmd = (self.register(self.is_float))
 		frame = tk.Frame(self)
@@ -205,14 +276,19 @@ class MapTableEditor(tk.Frame):
 		tk.Entry(frame_cur, width=4, textvariable=self.string_step_cur, validate='all', validatecommand=(vcmd, '%P')).pack(side=tk.LEFT)
 		tk.Button(frame_cur, text="Add (Key Q)", command=self.inc_cur).pack(side=tk.LEFT)
 		tk.Button(frame_cur, text="Sub (Key A)", command=self.dec_cur).pack(side=tk.LEFT)
+		self.show_hits = tk.IntVar()
+		tk.Checkbutton(frame_cur, text="Hits", variable=self.show_hits, command=lambda: self.table.show_heat(self.show_hits.get())).pack(side=tk.LEFT)
 		frame_sel = tk.LabelFrame(frame, text="User Selection")
 		frame_sel.pack(side=tk.RIGHT)
+		self.combo_op = ttk.Combobox(frame_sel, state="readonly", width=10, values = [label for label, op, signed in OPERATIONS])
+		self.combo_op.current(0)
+		self.combo_op.pack(side=tk.LEFT)
 		self.string_step_sel = tk.StringVar()
 		self.string_step_sel.set(str(step))
 		tk.Entry(frame_sel, width=4, textvariable=self.string_step_sel, validate='all', validatecommand=(vcmd, '%P')).pack(side=tk.LEFT)
 		tk.Button(frame_sel, text="Add (Key +)", command=self.inc_sel).pack(side=tk.LEFT)
 		tk.Button(frame_sel, text="Sub (Key -)", command=self.dec_sel).pack(side=tk.LEFT)
-		self.table = MapTable(self, xname, read_xdata, yname, read_ydata, name, read_data, write_cell, xfmt, yfmt, datafmt)
+		self.table = MapTable(self, xname, read_xdata, yname, read_ydata, name, read_data, write_cell, xfmt, yfmt, datafmt, write_row, quantize, stats)
 		self.get_xvalue = get_xvalue
 		self.get_yvalue = get_yvalue
 		self.table.color_cells()
@@ -227,13 +303,16 @@ class MapTableEditor(tk.Frame):
 	def dec_cur(self):
 		self.table.modify_cursor(-float(self.string_step_cur.get()), self.combo_algo.current())
 	def inc_sel(self):
-		self.table.modify_selection(+float(self.string_step_sel.get()))
+		label, op, signed = OPERATIONS[self.combo_op.current()]
+		self.table.modify_selection(+float(self.string_step_sel.get()), op)
 	def dec_sel(self):
-		self.table.modify_selection(-float(self.string_step_sel.get()))
+		label, op, signed = OPERATIONS[self.combo_op.current()]
+		self.table.modify_selection((-1 if(signed) else 1)*float(self.string_step_sel.get()), op)
 	def update(self):
 		self.table.do_interpolation(self.get_xvalue(), self.get_yvalue())
 		self.table.draw_cursor()
 		self.table.draw_selection()
+		self.table.draw_heat()
 	def reload(self):
 		self.table.reload()
 		self.table.color_cells()
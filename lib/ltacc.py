@@ -1,5 +1,8 @@
-import can 
-from lib.gui_fileprogress import FileProgress_widget
+import can
+import time
+from collections import deque
+from lib.busstats import BusStats
+from lib.readplan import changed_ranges
 
 # Some constants
 BO_BE = 'big'
@@ -19,9 +22,27 @@ class LiveTuningAccess:
         ("T6: L0-H3 (Full ROM)"  , 0x00000000, 0x100000, "dump.bin")
     ]
 
+    # Single answer frame reads, by size
+    read_opcodes = {4: (0x50, "Word"), 2: (0x51, "Half"), 1: (0x52, "Byte")}
+
+    # Answer timeout bounds (s) and extra attempts of a lost read
+    min_timeout = 0.005
+    max_timeout = 1.0
+    retries = 3
+
     def __init__(self, fp):
         self.bus = None
         self.fp = fp
+        # In-memory copy of the calibration block, see load_shadow()
+        self.shadow = None
+        self.shadow_base = 0
+        self.stats = BusStats()
+        # (opcode, send time) of the reads waiting for an answer
+        self.in_flight = deque()
+        # Smoothed answer wait and its deviation, see answer_timeout()
+        self.srtt = None
+        self.rttvar = 0.0
+        self.answer_end = 0.0
 
     def open_can(self, interface, channel, bitrate):
         if(self.bus != None): self.close_can()
@@ -40,6 +61,11 @@ class LiveTuningAccess:
         # The kernel filtering does not filter out the error messages.
         # So force library filtering.
         self.bus._is_filtered = False
+        self.stats = BusStats(bitrate)
+        self.in_flight.clear()
+        self.srtt = None
+        self.rttvar = 0.0
+        self.answer_end = 0.0
 
     def close_can(self):
         if(self.bus == None): return
@@ -47,55 +73,172 @@ class LiveTuningAccess:
         self.bus.shutdown()
         self.bus = None
 
-    def read_memory(self, address, size):
-        if   (size == 4):
-            msg = can.Message(
-                is_extended_id = False, arbitration_id = 0x50,
-                data = address.to_bytes(4, BO_BE)
-            )
-            self.bus.send(msg)
-            msg = self.bus.recv(timeout=1.0)
-            if(msg == None): raise ECUException("ECU Read Word failed!")
-            if(msg.dlc != 4): raise ECUException("Unexpected answer!")
-            data = msg.data
-        elif(size == 2):
-            msg = can.Message(
-                is_extended_id = False, arbitration_id = 0x51,
-                data = address.to_bytes(4, BO_BE)
-            )
-            self.bus.send(msg)
-            msg = self.bus.recv(timeout=1.0)
-            if(msg == None): raise ECUException("ECU Read Half failed!")
-            if(msg.dlc != 2): raise ECUException("Unexpected answer!")
-            data = msg.data
-        elif(size == 1):
+    def send(self, msg):
+        self.bus.send(msg)
+        self.stats.frame_out(msg)
+
+    def recv(self, timeout=None):
+        msg = self.bus.recv(timeout=self.answer_timeout() if(timeout == None) else timeout)
+        if(msg != None): self.stats.frame_in(msg)
+        return msg
+
+    def get_stats(self):
+        stats = self.stats.get()
+        stats['answer_timeout'] = self.answer_timeout()
+        return stats
+
+    def answer_timeout(self):
+        # Same estimator as TCP (RFC 6298): srtt + 4*rttvar, clamped. Until
+        # the first answer is seen, wait as long as the fixed timeout did.
+        if(self.srtt == None): return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.srtt + 4*self.rttvar))
+
+    def add_rtt_sample(self, rtt):
+        if(self.srtt == None):
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75*self.rttvar + 0.25*abs(self.srtt - rtt)
+            self.srtt = 0.875*self.srtt + 0.125*rtt
+
+    def read_request(self, address, size):
+        if(size in self.read_opcodes):
             msg = can.Message(
-                is_extended_id = False, arbitration_id = 0x52,
+                is_extended_id = False, arbitration_id = self.read_opcodes[size][0],
                 data = address.to_bytes(4, BO_BE)
             )
-            self.bus.send(msg)
-            msg = self.bus.recv(timeout=1.0)
-            if(msg == None): raise ECUException("ECU Read Byte failed!")
-            if(msg.dlc != 1): raise ECUException("Unexpected answer!")
-            data = msg.data
         elif(size < 256):
             msg = can.Message(
                 is_extended_id = False, arbitration_id = 0x53,
                 data = address.to_bytes(4, BO_BE) + size.to_bytes(1, BO_BE)
             )
-            self.bus.send(msg)
-            data = bytearray()
-            while(size > 0):
-                chunk_size = min(8, size);
-                msg = self.bus.recv(timeout=1.0)
-                if(msg == None): raise ECUException("ECU Read Buffer failed!")
-                if(msg.dlc != chunk_size): raise ECUException("Unexpected answer!")
-                data += msg.data
-                size -= chunk_size
         else:
             raise ECUException("ECU Read too many bytes!")
+        self.send(msg)
+        self.stats.request(msg.arbitration_id)
+        self.in_flight.append((msg.arbitration_id, time.perf_counter()))
+
+    def recv_answer(self, sent, timeout):
+        # First frame of an answer. Its delay since the request feeds the
+        # estimator when it is a true round trip: the request was sent after
+        # the previous answer ended (not queued behind it in a burst) and
+        # the timeout was not forced by a retry (Karn's rule).
+        msg = self.recv(timeout)
+        if(msg != None and timeout == None and sent >= self.answer_end):
+            self.add_rtt_sample(time.perf_counter() - sent)
+        return msg
+
+    def read_answer(self, size, timeout=None):
+        opcode, sent = self.in_flight.popleft() if(self.in_flight) else (None, time.perf_counter())
+        if(size in self.read_opcodes):
+            msg = self.recv_answer(sent, timeout)
+            if(msg == None):
+                self.stats.timeout()
+                raise ECUException(f"ECU Read {self.read_opcodes[size][1]} failed!")
+            if(msg.dlc != size):
+                self.stats.dlc_error()
+                raise ECUException("Unexpected answer!")
+            self.answer_end = time.perf_counter()
+            self.stats.answer(opcode, self.answer_end - sent)
+            return msg.data
+        data = bytearray()
+        while(size > 0):
+            chunk_size = min(8, size);
+            msg = self.recv_answer(sent, timeout) if(not data) else self.recv(timeout)
+            if(msg == None):
+                self.stats.timeout()
+                raise ECUException("ECU Read Buffer failed!")
+            if(msg.dlc != chunk_size):
+                self.stats.dlc_error()
+                raise ECUException("Unexpected answer!")
+            data += msg.data
+            size -= chunk_size
+        self.answer_end = time.perf_counter()
+        self.stats.answer(opcode, self.answer_end - sent)
         return data
 
+    def drain(self, timeout=None):
+        # Throw away late answers, so they are not matched to the next request.
+        self.in_flight.clear()
+        while(self.recv(timeout) != None): pass
+
+    def read_ecu(self, address, size):
+        # Stop-and-wait read. A lost request or answer is read again up to
+        # "retries" times, doubling the timeout each time, after the late
+        # frames of the failed attempt were drained.
+        timeout = None
+        for attempt in range(self.retries + 1):
+            # Stale frames left over from an earlier failure
+            self.drain(0)
+            self.read_request(address, size)
+            try:
+                return self.read_answer(size, timeout)
+            except ECUException:
+                # Late frames of this attempt must not answer the next request.
+                self.drain()
+                if(attempt == self.retries): raise
+                self.stats.retry()
+                timeout = min(self.max_timeout, 2*(timeout or self.answer_timeout()))
+
+    def read_memory(self, address, size):
+        if(self.in_shadow(address, size)):
+            offset = address - self.shadow_base
+            return self.shadow[offset:offset+size]
+        return self.read_ecu(address, size)
+
+    def read_many(self, requests, window=4):
+        # Send requests in bursts of "window" and then collect the answers.
+        # The protocol has no tags, so answers are matched to requests by
+        # order and checked by size. A lost request or answer frame can only
+        # show up as a missing frame at the end of the burst, therefore a
+        # failing burst is flushed and read again stop-and-wait.
+        results = [None] * len(requests)
+        pending = []
+        for i, (address, size) in enumerate(requests):
+            if(self.in_shadow(address, size)): results[i] = self.read_memory(address, size)
+            else: pending.append(i)
+        for i in range(0, len(pending), window):
+            burst = [requests[j] for j in pending[i:i+window]]
+            # Stale frames left over from an earlier failure
+            self.drain(0)
+            for address, size in burst:
+                self.read_request(address, size)
+            try:
+                answers = [self.read_answer(size) for address, size in burst]
+            except ECUException:
+                self.drain()
+                answers = [self.read_ecu(address, size) for address, size in burst]
+            for j, answer in zip(pending[i:i+window], answers):
+                results[j] = answer
+        return results
+
+    def read_buffer(self, address, size):
+        # Any size, as pipelined reads of the protocol maximum (255 bytes).
+        requests = [(address+offset, min(255, size-offset)) for offset in range(0, size, 255)]
+        return b"".join(self.read_many(requests))
+
+    def load_shadow(self, address, size):
+        # Bulk read a memory block once, then serve reads inside it from
+        # memory. Every write_memory keeps it coherent.
+        self.shadow = None
+        shadow = bytearray(self.read_buffer(address, size))
+        self.shadow_base = address
+        self.shadow = shadow
+
+    def invalidate_shadow(self):
+        self.shadow = None
+
+    def in_shadow(self, address, size):
+        return (self.shadow != None and address >= self.shadow_base and
+            address + size <= self.shadow_base + len(self.shadow))
+
+    def update_shadow(self, address, data):
+        if(self.shadow == None): return
+        start = max(address, self.shadow_base)
+        end = min(address + len(data), self.shadow_base + len(self.shadow))
+        if(start < end):
+            self.shadow[start-self.shadow_base:end-self.shadow_base] = data[start-address:end-address]
+
     def write_memory(self, address, data, verify = False):
         size = len(data)
         if   (size == 4):
@@ -103,44 +246,71 @@ class LiveTuningAccess:
                 is_extended_id = False, arbitration_id = 0x54,
                 data = address.to_bytes(4, BO_BE) + data
             )
-            self.bus.send(msg)
+            self.send(msg)
         elif(size == 2):
             msg = can.Message(
                 is_extended_id = False, arbitration_id = 0x55,
                 data = address.to_bytes(4, BO_BE) + data
             )
-            self.bus.send(msg)
+            self.send(msg)
         elif(size == 1):
             msg = can.Message(
                 is_extended_id = False, arbitration_id = 0x56,
                 data = address.to_bytes(4, BO_BE) + data
             )
-            self.bus.send(msg)
+            self.send(msg)
         elif(size < 256):
             offset = 0
             msg = can.Message(
                 is_extended_id = False, arbitration_id = 0x57,
                 data = address.to_bytes(4, BO_BE) + size.to_bytes(1, BO_BE)
             )
-            self.bus.send(msg)
+            self.send(msg)
             while(size > 0):
                 chunk_size = min(8, size)
                 msg = can.Message(
                     is_extended_id = False, arbitration_id = 0x57,
                     data = data[offset:offset+chunk_size]
                 )
-                self.bus.send(msg)
+                self.send(msg)
                 size -= chunk_size
                 offset += chunk_size
         else:
             raise ECUException("ECU Write too many bytes!")
-        if(verify and data != self.read_memory(address, len(data))):
+        self.stats.request(msg.arbitration_id)
+        self.update_shadow(address, data)
+        if(verify and data != self.read_ecu(address, len(data))):
+            self.invalidate_shadow()
             raise ECUException("ECU Write failed!")
 
     def download_verify(self, address, size, filename):
-        self.fp.download(address, size, filename, self.read_memory, 128)
-        self.fp.verify(address, filename, self.read_memory, 128)
+        # Single pass: 255 byte reads, 8 per progress step, then only a
+        # sample of the chunks is read again. A download served by the
+        # shadow is already coherent with the ECU.
+        self.fp.download(address, size, filename, self.read_buffer, 8*255)
+        if(not self.in_shadow(address, size)):
+            self.fp.verify_sampled(address, filename, self.read_memory, 255)
 
     def upload_verify(self, address, filename):
-        self.fp.upload(address, filename, self.write_memory, 128, chunk_pause=0.01)
-        self.fp.verify(address, filename, self.read_memory, 128)
\ No newline at end of file
+        # Differential upload: compare the file with the ECU contents, read
+        # fresh (reloading the shadow if it holds the block, the ECU may have
+        # changed behind our back), and only write and verify the changed
+        # ranges. A sample of the whole file is then read again from the ECU.
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if(self.in_shadow(address, len(data))):
+            self.load_shadow(self.shadow_base, len(self.shadow))
+            current = self.read_memory(address, len(data))
+        else:
+            current = self.read_buffer(address, len(data))
+        ranges = changed_ranges(current, data)
+        try:
+            if(ranges):
+                self.fp.upload_ranges(address, filename, self.write_memory, ranges, 128, chunk_pause=0.01)
+                self.fp.verify_ranges(address, filename, self.read_ecu, ranges, 255)
+            else:
+                self.fp.log(f"{filename} already matches 0x{address:08X}, nothing to upload.")
+            self.fp.verify_sampled(address, filename, self.read_ecu, 255)
+        except ECUException:
+            self.invalidate_shadow()
+            raise
\ No newline at end of file
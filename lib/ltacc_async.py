@@ -0,0 +1,162 @@
+import asyncio
+import can
+from lib.ltacc import LiveTuningAccess, ECUException
+
+# Some constants
+BO_BE = 'big'
+
+class AsyncLiveTuningAccess:
+    """
+    Coroutine flavour of LiveTuningAccess.
+
+    Frames are received by a python-can Notifier into an AsyncBufferedReader,
+    so waiting for the ECU never blocks the event loop. The protocol has no
+    request tags, so one request/answer exchange is done at a time under
+    self.lock; other coroutines keep running while it is pending.
+    """
+    zones = LiveTuningAccess.zones
+    read_opcodes = LiveTuningAccess.read_opcodes
+
+    def __init__(self, fp, timeout=0.25):
+        self.bus = None
+        self.notifier = None
+        self.reader = None
+        self.fp = fp
+        self.timeout = timeout
+        self.lock = None
+
+    async def open_can(self, interface, channel, bitrate):
+        if(self.bus != None): self.close_can()
+        self.fp.log(f"Open CAN {interface} {channel} @ {bitrate//1000:d} kbit/s")
+        self.bus = can.Bus(
+            interface = interface,
+            channel = channel,
+            can_filters = [{
+                "extended": False,
+                "can_id": 0x7A0,
+                "can_mask": 0x7FF
+            }],
+            bitrate = bitrate
+        )
+        # Same socketcan workaround as LiveTuningAccess.
+        self.bus._is_filtered = False
+        # Created here to bind to the running loop (Python 3.9).
+        self.lock = asyncio.Lock()
+        self.reader = can.AsyncBufferedReader()
+        self.notifier = can.Notifier(self.bus, [self.reader], loop=asyncio.get_running_loop())
+
+    def close_can(self):
+        if(self.bus == None): return
+        self.fp.log("Close CAN")
+        self.notifier.stop()
+        self.bus.shutdown()
+        self.notifier = None
+        self.reader = None
+        self.bus = None
+
+    def drop_stale(self):
+        # Late answers of a timed out request must not match the next one.
+        while(not self.reader.buffer.empty()):
+            self.reader.buffer.get_nowait()
+
+    async def recv(self, error):
+        try:
+            return await asyncio.wait_for(self.reader.get_message(), self.timeout)
+        except asyncio.TimeoutError:
+            raise ECUException(error)
+
+    async def read_memory(self, address, size):
+        async with self.lock:
+            self.drop_stale()
+            if(size in self.read_opcodes):
+                opcode, name = self.read_opcodes[size]
+                self.bus.send(can.Message(
+                    is_extended_id = False, arbitration_id = opcode,
+                    data = address.to_bytes(4, BO_BE)
+                ))
+                msg = await self.recv(f"ECU Read {name} failed!")
+                if(msg.dlc != size): raise ECUException("Unexpected answer!")
+                return msg.data
+            elif(size < 256):
+                self.bus.send(can.Message(
+                    is_extended_id = False, arbitration_id = 0x53,
+                    data = address.to_bytes(4, BO_BE) + size.to_bytes(1, BO_BE)
+                ))
+                data = bytearray()
+                while(size > 0):
+                    chunk_size = min(8, size)
+                    msg = await self.recv("ECU Read Buffer failed!")
+                    if(msg.dlc != chunk_size): raise ECUException("Unexpected answer!")
+                    data += msg.data
+                    size -= chunk_size
+                return data
+            else:
+                raise ECUException("ECU Read too many bytes!")
+
+    async def write_memory(self, address, data, verify = False):
+        size = len(data)
+        async with self.lock:
+            if(size in (4, 2, 1)):
+                opcode = {4: 0x54, 2: 0x55, 1: 0x56}[size]
+                self.bus.send(can.Message(
+                    is_extended_id = False, arbitration_id = opcode,
+                    data = address.to_bytes(4, BO_BE) + data
+                ))
+            elif(size < 256):
+                self.bus.send(can.Message(
+                    is_extended_id = False, arbitration_id = 0x57,
+                    data = address.to_bytes(4, BO_BE) + size.to_bytes(1, BO_BE)
+                ))
+                for offset in range(0, size, 8):
+                    self.bus.send(can.Message(
+                        is_extended_id = False, arbitration_id = 0x57,
+                        data = data[offset:offset+8]
+                    ))
+            else:
+                raise ECUException("ECU Write too many bytes!")
+        if(verify and data != await self.read_memory(address, size)):
+            raise ECUException("ECU Write failed!")
+
+    async def download(self, address, size, filename, chunk_size=128):
+        self.fp.log(f"Downloading from 0x{address:08X} (size {size} bytes) to {filename}")
+        self.fp.progress_start(size)
+        with open(filename, 'wb') as f:
+            for offset in range(0, size, chunk_size):
+                f.write(await self.read_memory(address+offset, min(chunk_size, size-offset)))
+                self.fp.progress(min(offset+chunk_size, size))
+        self.fp.progress_end()
+        self.fp.log("Download complete.")
+
+    async def upload(self, address, filename, chunk_size=128, chunk_pause=0.01):
+        with open(filename, 'rb') as f:
+            file_data = f.read()
+        self.fp.log(f"Uploading {len(file_data)} bytes from {filename} to 0x{address:08X}")
+        self.fp.progress_start(len(file_data))
+        for offset in range(0, len(file_data), chunk_size):
+            await self.write_memory(address+offset, file_data[offset:offset+chunk_size])
+            self.fp.progress(min(offset+chunk_size, len(file_data)))
+            await asyncio.sleep(chunk_pause)
+        self.fp.progress_end()
+        self.fp.log("Upload complete.")
+
+    async def verify(self, address, filename, chunk_size=128):
+        self.fp.log(f"Verifying {filename} against 0x{address:08X}")
+        with open(filename, 'rb') as f:
+            file_data = f.read()
+        self.fp.progress_start(len(file_data))
+        for offset in range(0, len(file_data), chunk_size):
+            file_chunk = file_data[offset:offset+chunk_size]
+            if(await self.read_memory(address+offset, len(file_chunk)) != file_chunk):
+                self.fp.log(f"Verification FAILED at 0x{address+offset:08X}")
+                raise ECUException("Verification failed!")
+            self.fp.progress(offset+len(file_chunk))
+        self.fp.log("Verification SUCCESSFUL!")
+        self.fp.progress_end()
+
+    async def download_verify(self, address, size, filename):
+        await self.download(address, size, filename, 128)
+        await self.verify(address, filename, 128)
+
+    async def upload_verify(self, address, filename):
+        await self.upload(address, filename, 128, chunk_pause=0.01)
+        await self.verify(address, filename, 128)
@@ -0,0 +1,276 @@
+import bisect
+from array import array
+
+# Table model behind the map editor, without any Tk: breakpoint lookup,
+# bilinear interpolation and bulk edits of a region. Cells are a 2D numpy
+# array when numpy is installed, a list of array('d') rows otherwise, both
+# indexed data[y][x]. exact holds the same cells before quantization, so
+# edits finer than the cell resolution accumulate.
+
+# numpy is optional, it vectorizes the lookups and the bulk operations
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Bulk operations of a selection: (label, TableModel method, uses the sign)
+OPERATIONS = (
+    ("Add", "offset", True),
+    ("Scale %", "scale", True),
+    ("Set", "set", False),
+    ("Smooth", "smooth", False),
+    ("Interpolate", "interpolate_corners", False)
+)
+
+def axis_cell(axis, value):
+    """
+    Index of the last breakpoint at or below value, as the ECU looks it up:
+    repeated leading breakpoints are skipped and values below the axis stay
+    on the first cell.
+    """
+    start = bisect.bisect_right(axis, axis[0]) - 1
+    return max(start, bisect.bisect_right(axis, value) - 1)
+
+def axis_ratio(axis, cell, value):
+    # Position of value between breakpoints cell and cell+1, 0.0 to 1.0.
+    if(cell+1 < len(axis)):
+        diff = value - axis[cell]
+        if(diff > 0): return diff / (axis[cell+1] - axis[cell])
+    return 0.0
+
+class TableModel:
+    def __init__(self, xdata, ydata, data, write_row=None, quantize=None):
+        # write_row(x, y, values) stores a row span in the ECU, quantize(values)
+        # rounds values to what the cells can hold.
+        self.write_row = write_row
+        self.quantize = quantize
+        # Lowest and highest value a cell can hold
+        self.limits = sorted(quantize([-1e300, 1e300])) if(quantize != None) else None
+        self.load(xdata, ydata, data)
+
+    def load(self, xdata, ydata, data):
+        self.xdata = list(xdata)
+        self.ydata = list(ydata)
+        self.xsize = len(self.xdata)
+        self.ysize = len(self.ydata)
+        if(numpy != None):
+            self.data = numpy.array(data, dtype=float).reshape(self.ysize, self.xsize)
+            self.exact = self.data.copy()
+            self.xaxis = numpy.array(self.xdata, dtype=float)
+            self.yaxis = numpy.array(self.ydata, dtype=float)
+        else:
+            self.data = [array('d', row) for row in data]
+            self.exact = [array('d', row) for row in self.data]
+
+    def range(self):
+        """(min, max) of all the cells."""
+        if(numpy != None): return float(self.data.min()), float(self.data.max())
+        return min(min(row) for row in self.data), max(max(row) for row in self.data)
+
+    def interpolate(self, xvalue, yvalue):
+        """(cx, cy, x2r, y2r, m, value): cell, ratios, 2x2 weights and result."""
+        cx = axis_cell(self.xdata, xvalue)
+        cy = axis_cell(self.ydata, yvalue)
+        x2r = axis_ratio(self.xdata, cx, xvalue)
+        y2r = axis_ratio(self.ydata, cy, yvalue)
+        x1r = 1.0 - x2r
+        y1r = 1.0 - y2r
+        m = ((y1r*x1r, y1r*x2r), (y2r*x1r, y2r*x2r))
+        res = 0.0
+        for y in range(0, 2):
+            for x in range(0, 2):
+                # A zero weight may be out of the table.
+                if(m[y][x] != 0.0): res += self.data[cy+y][cx+x]*m[y][x]
+        return (cx, cy, x2r, y2r, m, float(res))
+
+    def lookup_many(self, xvalues, yvalues):
+        """
+        Cells and ratios of many points at once: (cx, cy, x2r, y2r) columns,
+        numpy arrays when numpy is installed, lists otherwise.
+        """
+        if(numpy == None):
+            cx = [axis_cell(self.xdata, v) for v in xvalues]
+            cy = [axis_cell(self.ydata, v) for v in yvalues]
+            x2r = [axis_ratio(self.xdata, c, v) for c, v in zip(cx, xvalues)]
+            y2r = [axis_ratio(self.ydata, c, v) for c, v in zip(cy, yvalues)]
+            return cx, cy, x2r, y2r
+        cx, x2r = self.axis_lookup(self.xaxis, xvalues)
+        cy, y2r = self.axis_lookup(self.yaxis, yvalues)
+        return cx, cy, x2r, y2r
+
+    def axis_lookup(self, axis, values):
+        values = numpy.asarray(values, dtype=float)
+        start = numpy.searchsorted(axis, axis[0], side='right') - 1
+        cell = numpy.maximum(start, numpy.searchsorted(axis, values, side='right') - 1)
+        if(len(axis) < 2): return cell, numpy.zeros(len(values))
+        upper = numpy.minimum(cell+1, len(axis)-1)
+        step = axis[upper] - axis[cell]
+        diff = values - axis[cell]
+        ratio = numpy.where((upper > cell) & (diff > 0), diff / numpy.where(step == 0, 1, step), 0.0)
+        return cell, ratio
+
+    def interpolate_many(self, xvalues, yvalues):
+        """Interpolated values of many points at once."""
+        cx, cy, x2r, y2r = self.lookup_many(xvalues, yvalues)
+        if(numpy == None):
+            return [self.weighted(x, y, xr, yr) for x, y, xr, yr in zip(cx, cy, x2r, y2r)]
+        # Clamp the upper neighbours, their weight is 0 at the table edges.
+        cx1 = numpy.minimum(cx+1, self.xsize-1)
+        cy1 = numpy.minimum(cy+1, self.ysize-1)
+        d = self.data
+        return ((1-y2r)*((1-x2r)*d[cy, cx] + x2r*d[cy, cx1]) +
+            y2r*((1-x2r)*d[cy1, cx] + x2r*d[cy1, cx1]))
+
+    def weighted(self, cx, cy, x2r, y2r):
+        cx1 = min(cx+1, self.xsize-1)
+        cy1 = min(cy+1, self.ysize-1)
+        d = self.data
+        return ((1-y2r)*((1-x2r)*d[cy][cx] + x2r*d[cy][cx1]) +
+            y2r*((1-x2r)*d[cy1][cx] + x2r*d[cy1][cx1]))
+
+    def clip(self, x1, y1, x2, y2):
+        return max(0, x1), max(0, y1), min(x2, self.xsize), min(y2, self.ysize)
+
+    def region(self, x1, y1, x2, y2):
+        """Copy of the exact values of a region, as a list of rows."""
+        if(numpy != None): return self.exact[y1:y2, x1:x2].tolist()
+        return [list(self.exact[y][x1:x2]) for y in range(y1, y2)]
+
+    def put_region(self, x1, y1, rows):
+        # Store new rows. The exact values are kept (within the limits) so
+        # that steps smaller than the cell resolution add up, the cells hold
+        # them quantized. One write_row per row that changed.
+        for i, row in enumerate(rows):
+            row = [float(v) for v in row]
+            if(self.limits != None): row = [min(self.limits[1], max(self.limits[0], v)) for v in row]
+            cells = self.quantize(row) if(self.quantize != None) else row
+            y = y1 + i
+            changed = list(self.data[y][x1:x1+len(row)]) != list(cells)
+            if(numpy != None):
+                self.exact[y, x1:x1+len(row)] = row
+                self.data[y, x1:x1+len(row)] = cells
+            else:
+                self.exact[y][x1:x1+len(row)] = array('d', row)
+                self.data[y][x1:x1+len(row)] = array('d', cells)
+            if(self.write_row != None and changed): self.write_row(x1, y, cells)
+
+    # Bulk operations on the region x1 <= x < x2, y1 <= y < y2.
+
+    def offset(self, x1, y1, x2, y2, value):
+        x1, y1, x2, y2 = self.clip(x1, y1, x2, y2)
+        if(numpy != None): self.put_region(x1, y1, self.exact[y1:y2, x1:x2] + value)
+        else: self.put_region(x1, y1, [[v + value for v in row] for row in self.region(x1, y1, x2, y2)])
+
+    def scale(self, x1, y1, x2, y2, percent):
+        x1, y1, x2, y2 = self.clip(x1, y1, x2, y2)
+        factor = 1.0 + percent / 100.0
+        if(numpy != None): self.put_region(x1, y1, self.exact[y1:y2, x1:x2] * factor)
+        else: self.put_region(x1, y1, [[v * factor for v in row] for row in self.region(x1, y1, x2, y2)])
+
+    def set(self, x1, y1, x2, y2, value):
+        x1, y1, x2, y2 = self.clip(x1, y1, x2, y2)
+        self.put_region(x1, y1, [[value] * (x2-x1) for y in range(y1, y2)])
+
+    def smooth(self, x1, y1, x2, y2, value=None):
+        # Every cell becomes the mean of its 3x3 neighbourhood (inside the
+        # table), computed from the values before the operation.
+        x1, y1, x2, y2 = self.clip(x1, y1, x2, y2)
+        if(numpy != None):
+            padded = numpy.pad(self.exact, 1, constant_values=numpy.nan)
+            windows = numpy.stack([padded[y1+dy:y2+dy, x1+dx:x2+dx] for dy in range(3) for dx in range(3)])
+            self.put_region(x1, y1, numpy.nanmean(windows, axis=0))
+            return
+        rows = []
+        for y in range(y1, y2):
+            row = []
+            for x in range(x1, x2):
+                cells = [self.exact[j][i] for j in range(max(0, y-1), min(self.ysize, y+2))
+                    for i in range(max(0, x-1), min(self.xsize, x+2))]
+                row.append(sum(cells) / len(cells))
+            rows.append(row)
+        self.put_region(x1, y1, rows)
+
+    def interpolate_corners(self, x1, y1, x2, y2, value=None):
+        # Bilinear fill between the 4 corner cells, along the axis values.
+        x1, y1, x2, y2 = self.clip(x1, y1, x2, y2)
+        if(x2 <= x1 or y2 <= y1): return
+        def ratios(axis, a, b):
+            span = axis[b] - axis[a]
+            if(span == 0): return [(i-a)/(b-a) if(b > a) else 0.0 for i in range(a, b+1)]
+            return [(axis[i]-axis[a])/span for i in range(a, b+1)]
+        xr = ratios(self.xdata, x1, x2-1)
+        yr = ratios(self.ydata, y1, y2-1)
+        d = self.exact
+        v00, v01 = float(d[y1][x1]), float(d[y1][x2-1])
+        v10, v11 = float(d[y2-1][x1]), float(d[y2-1][x2-1])
+        self.put_region(x1, y1, [[(1-ty)*((1-tx)*v00 + tx*v01) + ty*((1-tx)*v10 + tx*v11) for tx in xr] for ty in yr])
+
+class CellStats:
+    """
+    Per-cell accumulation of points looked up in a TableModel, with the
+    same bilinear weights as the cursor: total weight (time at cell), number
+    of points touching the cell and weighted sum of a value. Cells are
+    indexed y*xsize+x.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.clear()
+
+    def clear(self):
+        size = self.model.xsize * self.model.ysize
+        if(numpy != None):
+            self.weight = numpy.zeros(size)
+            self.hits = numpy.zeros(size, dtype=numpy.int64)
+            self.total = numpy.zeros(size)
+        else:
+            self.weight = [0.0] * size
+            self.hits = [0] * size
+            self.total = [0.0] * size
+
+    def corners(self, cx, cy, x2r, y2r):
+        # (cell index, weight) of the 4 cells around the points. Cells out
+        # of the table are clamped to the edge, they always get a 0 weight.
+        xsize, ysize = self.model.xsize, self.model.ysize
+        for dy in (0, 1):
+            for dx in (0, 1):
+                if(numpy != None):
+                    index = numpy.minimum(cy+dy, ysize-1)*xsize + numpy.minimum(cx+dx, xsize-1)
+                    yield index, (y2r if(dy) else 1-y2r) * (x2r if(dx) else 1-x2r)
+                else:
+                    index = [min(y+dy, ysize-1)*xsize + min(x+dx, xsize-1) for x, y in zip(cx, cy)]
+                    yield index, [(yr if(dy) else 1-yr) * (xr if(dx) else 1-xr) for xr, yr in zip(x2r, y2r)]
+
+    def add(self, xvalues, yvalues, values=None):
+        cx, cy, x2r, y2r = self.model.lookup_many(xvalues, yvalues)
+        if(numpy != None):
+            size = len(self.weight)
+            if(values is not None): values = numpy.asarray(values, dtype=float)
+            for index, w in self.corners(cx, cy, x2r, y2r):
+                self.weight += numpy.bincount(index, w, size)
+                self.hits += numpy.bincount(index, w > 0, size).astype(numpy.int64)
+                if(values is not None): self.total += numpy.bincount(index, w*values, size)
+            return
+        for index, w in self.corners(cx, cy, x2r, y2r):
+            for k, (i, wi) in enumerate(zip(index, w)):
+                if(wi <= 0): continue
+                self.weight[i] += wi
+                self.hits[i] += 1
+                if(values is not None): self.total[i] += wi * values[k]
+
+    def rows(self, cells):
+        # A per-cell array as a list of rows of Python numbers.
+        xsize = self.model.xsize
+        return [[cells[i].item() if(numpy != None) else cells[i] for i in range(y*xsize, (y+1)*xsize)]
+            for y in range(self.model.ysize)]
+
+    def mean(self, min_weight=0.0):
+        """Weighted mean value of every cell as rows, None below min_weight."""
+        xsize = self.model.xsize
+        rows = []
+        for y in range(self.model.ysize):
+            row = []
+            for i in range(y*xsize, (y+1)*xsize):
+                w = float(self.weight[i])
+                row.append(float(self.total[i]) / w if(w > 0 and w >= min_weight) else None)
+            rows.append(row)
+        return rows
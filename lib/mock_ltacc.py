@@ -2,6 +2,8 @@
 
 import random
 import os # Import os for path handling and file existence check
+import threading
+from lib.busstats import BusStats
 
 # Some constants
 BO_BE = 'big'
@@ -20,6 +22,7 @@ class MockLiveTuningAccess:
         self.sym_map = None
         self.sram_content = None # New: To store loaded SRAM content
         self.sram_base_addr = 0x40000000 # Base address for simulated SRAM
+        self.stats = BusStats() # Stays empty, there is no bus
 
     def set_sym_map(self, sym_map_obj):
         self.sym_map = sym_map_obj
@@ -45,8 +48,13 @@ class MockLiveTuningAccess:
     def close_can(self):
         self.fp.log("DEBUG MODE: Simulating CAN device disconnection.")
 
+    def log(self, msg):
+        # Reads also come from the acquisition thread, which must not touch Tk.
+        if threading.current_thread() is threading.main_thread():
+            self.fp.log(msg)
+
     def read_memory(self, address, size):
-        self.fp.log(f"DEBUG MODE: Simulating read from 0x{address:08X} with size {size}")
+        self.log(f"DEBUG MODE: Simulating read from 0x{address:08X} with size {size}")
 
         # Check for SRAM content first if loaded
         if self.sram_content is not None:
@@ -62,11 +70,11 @@ class MockLiveTuningAccess:
                     read_data = self.sram_content[offset : offset + bytes_to_read]
                     # If the requested size is larger than available, pad with zeros
                     if len(read_data) < size:
-                        self.fp.log(f"DEBUG MODE: Read from SRAM (0x{address:08X}) requested {size} bytes, but only {len(read_data)} bytes available from file. Padding with zeros.")
+                        self.log(f"DEBUG MODE: Read from SRAM (0x{address:08X}) requested {size} bytes, but only {len(read_data)} bytes available from file. Padding with zeros.")
                         read_data += b'\x00' * (size - len(read_data))
                     return read_data
                 else:
-                    self.fp.log(f"DEBUG MODE: Read from SRAM (0x{address:08X}) falls outside loaded content. Returning random bytes.")
+                    self.log(f"DEBUG MODE: Read from SRAM (0x{address:08X}) falls outside loaded content. Returning random bytes.")
                     return bytes([random.randint(0, 255) for _ in range(size)]) # Fallback for out of bounds reads within SRAM zone
 
 
@@ -99,6 +107,15 @@ class MockLiveTuningAccess:
         # For any other address (not SRAM and not a known symbol), return random bytes
         return bytes([random.randint(0, 255) for _ in range(size)])
 
+    def get_stats(self):
+        return self.stats.get()
+
+    def read_many(self, requests, window=4):
+        return [self.read_memory(address, size) for address, size in requests]
+
+    def read_buffer(self, address, size):
+        return self.read_memory(address, size)
+
     def write_memory(self, address, data, verify=False):
         self.fp.log(f"DEBUG MODE: Simulating write to 0x{address:08X} with data {data.hex()}")
         # If you want to simulate writes to SRAM, you'd update self.sram_content here
@@ -119,6 +136,12 @@ class MockLiveTuningAccess:
         if verify:
             self.fp.log("DEBUG MODE: Write verification skipped in mock mode.")
 
+    def load_shadow(self, address, size):
+        self.fp.log(f"DEBUG MODE: Reads are local, no shadow of 0x{address:08X} needed.")
+
+    def invalidate_shadow(self):
+        pass
+
     def upload_verify(self, address, filename):
         self.fp.log(f"DEBUG MODE: Simulating upload of {filename} to 0x{address:08X}")
 
@@ -0,0 +1,87 @@
+BO_BE = 'big'
+
+# Largest 0x53 buffer read the ECU answers.
+MAX_BLOCK = 255
+
+class MemoryImage:
+    """
+    A local copy of a window of ECU memory, filled by a ReadPlan and read by
+    the gauges.
+    """
+    def __init__(self, base, size):
+        self.base = base
+        self.data = bytearray(size)
+
+    def copy(self):
+        image = MemoryImage(self.base, 0)
+        image.data = bytearray(self.data)
+        return image
+
+    def load(self, address, data):
+        offset = address - self.base
+        self.data[offset:offset+len(data)] = data
+
+    def read(self, address, size):
+        offset = address - self.base
+        return bytes(self.data[offset:offset+size])
+
+    def read_buffer(self, address, size):
+        # Same as LiveTuningAccess, e.g. to read tables from a calibration file.
+        return self.read(address, size)
+
+    def read_int(self, address, size, signed=False):
+        offset = address - self.base
+        return int.from_bytes(self.data[offset:offset+size], BO_BE, signed=signed)
+
+class ReadPlan:
+    """
+    Groups a set of (address, size) spans into the fewest buffer reads.
+
+    Two spans end up in the same block when the hole between them is at most
+    max_gap bytes and the whole block still fits in one 0x53 request. Reading
+    a few unused bytes (one extra frame per 8 bytes) is much cheaper than one
+    more CAN round trip.
+    """
+    def __init__(self, spans, max_gap=64, max_block=MAX_BLOCK):
+        spans = sorted(set(spans))
+        if(len(spans) == 0): raise ValueError("Empty read plan!")
+        self.blocks = []
+        start, end = spans[0][0], spans[0][0]+spans[0][1]
+        for address, size in spans:
+            if(size > max_block): raise ValueError(f"Span at 0x{address:08X} is too big!")
+            new_end = max(end, address+size)
+            if(address - end <= max_gap and new_end - start <= max_block):
+                end = new_end
+            else:
+                self.blocks.append((start, end-start))
+                start, end = address, address+size
+        self.blocks.append((start, end-start))
+        self.base = self.blocks[0][0]
+        self.size = max(a+s for a, s in self.blocks) - self.base
+
+    def new_image(self):
+        return MemoryImage(self.base, self.size)
+
+    def execute(self, lta, image=None):
+        if(image == None): image = self.new_image()
+        for (address, size), data in zip(self.blocks, lta.read_many(self.blocks)):
+            image.load(address, data)
+        return image
+
+def changed_ranges(old, new, max_gap=16):
+    """
+    (offset, size) of the bytes of new that differ from old. Ranges closer
+    than max_gap are merged, rewriting a few equal bytes is cheaper than
+    the header frame of another write.
+    """
+    ranges = []
+    start = end = None
+    for offset in range(len(new)):
+        if(offset < len(old) and old[offset] == new[offset]): continue
+        if(start != None and offset - end < max_gap):
+            end = offset + 1
+            continue
+        if(start != None): ranges.append((start, end-start))
+        start, end = offset, offset + 1
+    if(start != None): ranges.append((start, end-start))
+    return ranges
@@ -0,0 +1,67 @@
+from math import gcd
+from lib.readplan import ReadPlan, MemoryImage
+
+class ChannelScheduler:
+    """
+    Polls every channel at its own rate with an even bus load per tick.
+
+    The scheduler ticks at the fastest channel rate. A channel of rate r is
+    read every tick_rate/r ticks. Channels of the same rate are first grouped
+    into ReadPlan blocks, then every block gets the phase that keeps the most
+    loaded tick lowest. This gives a fixed budget per tick, and slow channels
+    do not pile up on the same tick.
+
+    It is used like a ReadPlan: execute() reads the blocks due on this tick
+    into an image covering all the channels. The first execute() reads every
+    channel at once, so no snapshot holds a channel not read yet.
+    """
+    def __init__(self, spans, tick_rate=None, max_gap=64):
+        # spans are (address, size, rate in Hz)
+        if(tick_rate == None): tick_rate = max(rate for address, size, rate in spans)
+        self.period = 1.0 / tick_rate
+        groups = {}
+        for address, size, rate in spans:
+            divisor = max(1, round(tick_rate / rate))
+            groups.setdefault(divisor, []).append((address, size))
+        self.cycle = 1
+        for divisor in groups:
+            self.cycle = self.cycle * divisor // gcd(self.cycle, divisor)
+
+        # Slowest blocks first, they have the most freedom to be placed.
+        units = []
+        for divisor, group in groups.items():
+            for block in ReadPlan(group, max_gap).blocks:
+                units.append((divisor, block))
+        units.sort(key=lambda u: (-u[0], -u[1][1]))
+        self.load = [0] * self.cycle
+        slots = [[] for _ in range(self.cycle)]
+        for divisor, (address, size) in units:
+            # One request frame plus one answer frame per 8 bytes
+            cost = 1 + (size + 7) // 8
+            phase = min(range(divisor), key=lambda p: max(self.load[p::divisor]))
+            for tick in range(phase, self.cycle, divisor):
+                self.load[tick] += cost
+                slots[tick].append((address, size))
+        self.budget = max(self.load)
+
+        self.layout = ReadPlan([(address, size) for address, size, rate in spans], max_gap)
+        self.base = self.layout.base
+        self.size = self.layout.size
+        self.plans = [ReadPlan(s, max_gap) if(len(s) > 0) else None for s in slots]
+        self.tick = 0
+        self.primed = False
+
+    def new_image(self):
+        return MemoryImage(self.base, self.size)
+
+    def execute(self, lta, image=None):
+        if(image == None): image = self.new_image()
+        if(not self.primed):
+            # Read again next time if it fails.
+            self.layout.execute(lta, image)
+            self.primed = True
+            return image
+        plan = self.plans[self.tick % self.cycle]
+        self.tick += 1
+        if(plan != None): plan.execute(lta, image)
+        return image
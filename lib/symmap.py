@@ -0,0 +1,81 @@
+import os
+import re
+import pickle
+
+# Parsed .sym files are cached next to them (<file>.cache), rebuilt when the
+# .sym file changes. Bump on any change of the cached layout.
+CACHE_VERSION = 1
+
+class SYMMap:
+    def __init__(self, file):
+        self.file = file
+        self.syms = self.load_cache()
+        if(self.syms == None):
+            self.syms = self.parse()
+            self.save_cache()
+
+    def parse(self):
+        syms = {}
+        r = re.compile("^(.*) = (0x[0-9a-f]*);")
+        with open(self.file,'r') as f:
+            for line in f.readlines():
+                m = r.match(line)
+                if(m): syms[m.group(1)] = int(m.group(2), 16)
+        return syms
+
+    def source_key(self):
+        st = os.stat(self.file)
+        return (CACHE_VERSION, st.st_mtime_ns, st.st_size)
+
+    def load_cache(self):
+        try:
+            with open(self.file + ".cache", 'rb') as f:
+                key, syms = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            return None
+        return syms if(key == self.source_key()) else None
+
+    def save_cache(self):
+        # Best effort, a read-only install just parses every time.
+        tmp = self.file + ".cache.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump((self.source_key(), self.syms), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.file + ".cache")
+        except OSError:
+            pass
+
+    def get_sym_addr(self, symbol):
+        return self.syms[symbol]
+
+class SymbolRegistry:
+    """
+    The symbol files of a directory, keyed by firmware ID: the 4 bytes at
+    cal_base, which end the file name (T6eP138.sym is firmware b"P138").
+    Symbol files are only parsed when needed.
+    """
+    def __init__(self, directory):
+        self.files = {}
+        for name in sorted(os.listdir(directory)):
+            base, ext = os.path.splitext(name)
+            if(ext == ".sym" and len(base) >= 4):
+                self.files[base[-4:].encode('ascii')] = os.path.join(directory, name)
+        self.maps = {}
+
+    def ids(self):
+        return list(self.files)
+
+    def get(self, firmware_id):
+        if(firmware_id not in self.maps):
+            self.maps[firmware_id] = SYMMap(self.files[firmware_id])
+        return self.maps[firmware_id]
+
+    def identify(self, mem):
+        # SYMMap of the firmware running on the ECU, None if unknown.
+        # Firmwares sharing a cal_base address cost a single read.
+        ids = {}
+        for firmware_id in self.files:
+            address = self.get(firmware_id).get_sym_addr("cal_base")
+            if(address not in ids): ids[address] = bytes(mem.read_memory(address, 4))
+            if(ids[address] == firmware_id): return self.get(firmware_id)
+        return None
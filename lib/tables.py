@@ -0,0 +1,129 @@
+import configparser
+import struct
+from lib.channels import STRUCT_TYPES
+from lib.maptable import TableModel
+
+# Calibration tables edited by the tuner, defined in a .tables file next to
+# the .sym file of the firmware (INI layout, one section per table, see
+# patch/T6eP138.tables).
+
+def tables_filename(sym_filename):
+    return sym_filename.rsplit('.', 1)[0] + ".tables"
+
+def load_axis(section, prefix, length):
+    return {
+        'name': section.get(prefix + 'name', ""),
+        'symbol': section[prefix + 'symbol'],
+        'length': length,
+        'size': section.getint(prefix + 'size', 1),
+        'signed': section.getboolean(prefix + 'signed', False),
+        'scale': section.getfloat(prefix + 'scale', 1.0),
+        'offset': section.getfloat(prefix + 'offset', 0.0),
+        'fmt': section.get(prefix + 'format', "{:.0f}"),
+        'live': section.get(prefix + 'live', None)
+    }
+
+def load_tables(filename):
+    """Table definitions of a .tables file, in file order."""
+    parser = configparser.ConfigParser(interpolation=None)
+    with open(filename, 'r') as f:
+        parser.read_file(f)
+    tables = []
+    for name in parser.sections():
+        s = parser[name]
+        columns, rows = s.getint('columns'), s.getint('rows')
+        tables.append({
+            'name': name,
+            'symbol': s['symbol'],
+            'columns': columns,
+            'rows': rows,
+            'size': s.getint('size', 1),
+            'signed': s.getboolean('signed', False),
+            'scale': s.getfloat('scale', 1.0),
+            'offset': s.getfloat('offset', 0.0),
+            'step': s.getfloat('step', 1.0),
+            'fmt': s.get('format', "{:.1f}"),
+            'x': load_axis(s, 'x', columns),
+            'y': load_axis(s, 'y', rows)
+        })
+    return tables
+
+class Scaling:
+    # Big endian integers <-> shown values, raw * scale + offset.
+    def __init__(self, size, signed, scale, offset):
+        self.code = STRUCT_TYPES[(size, signed)]
+        self.size = size
+        self.scale = scale
+        self.offset = offset
+        bits = 8 * size
+        self.low, self.high = (-(1 << (bits-1)), (1 << (bits-1)) - 1) if(signed) else (0, (1 << bits) - 1)
+
+    def decode(self, data):
+        raw = struct.unpack(f">{len(data)//self.size}{self.code}", data)
+        return [v * self.scale + self.offset for v in raw]
+
+    def quantize(self, values):
+        # Values the cells can actually hold.
+        return self.decode(self.encode(values))
+
+    def encode(self, values):
+        raw = [min(self.high, max(self.low, round((v - self.offset) / self.scale))) for v in values]
+        return struct.pack(f">{len(raw)}{self.code}", *raw)
+
+class TableAccess:
+    """
+    One table bound to the symbols and a memory accessor (LiveTuningAccess
+    or AcquisitionWorker). Axes and cells are fetched with one bulk
+    read_buffer each, only when the editor is built.
+    """
+    def __init__(self, table, sym, mem, verify=lambda: False):
+        self.table = table
+        self.mem = mem
+        self.verify = verify
+        self.address = sym.get_sym_addr(table['symbol'])
+        self.scaling = Scaling(table['size'], table['signed'], table['scale'], table['offset'])
+        self.axes = {}
+        for a in ('x', 'y'):
+            axis = table[a]
+            self.axes[a] = (sym.get_sym_addr(axis['symbol']),
+                Scaling(axis['size'], axis['signed'], axis['scale'], axis['offset']), axis['length'])
+
+    def read_axis(self, a):
+        address, scaling, length = self.axes[a]
+        return scaling.decode(self.mem.read_buffer(address, length * scaling.size))
+
+    def read_data(self):
+        columns = self.table['columns']
+        values = self.scaling.decode(self.mem.read_buffer(self.address, self.table['rows'] * columns * self.scaling.size))
+        return [values[y*columns:(y+1)*columns] for y in range(self.table['rows'])]
+
+    def axes_model(self):
+        """TableModel of the axes only (cells at 0), enough to look points up."""
+        return TableModel(self.read_axis('x'), self.read_axis('y'),
+            [[0.0] * self.table['columns'] for _ in range(self.table['rows'])])
+
+    def cell_address(self, x, y):
+        return self.address + (y * self.table['columns'] + x) * self.scaling.size
+
+    def write_cell(self, x, y, value):
+        self.mem.write_memory(self.cell_address(x, y), self.scaling.encode([value]))
+
+    def write_row(self, x, y, values):
+        self.mem.write_memory(self.cell_address(x, y), self.scaling.encode(values), self.verify())
+
+    def editor_args(self, get_xvalue, get_yvalue):
+        """Keyword arguments of a MapTableEditor for this table."""
+        t = self.table
+        return {
+            'xname': t['x']['name'], 'read_xdata': lambda: self.read_axis('x'), 'get_xvalue': get_xvalue,
+            'yname': t['y']['name'], 'read_ydata': lambda: self.read_axis('y'), 'get_yvalue': get_yvalue,
+            'name': t['name'],
+            'read_data': self.read_data,
+            'write_cell': self.write_cell,
+            'write_row': self.write_row,
+            'quantize': self.scaling.quantize,
+            'xfmt': t['x']['fmt'],
+            'yfmt': t['y']['fmt'],
+            'datafmt': t['fmt'],
+            'step': t['step']
+        }
@@ -0,0 +1,130 @@
+import argparse
+import csv
+import os
+import sys
+from lib.datalog import DataLogReader
+from lib.maptable import TableModel, CellStats, numpy
+from lib.readplan import MemoryImage
+from lib.symmap import SYMMap, SymbolRegistry
+from lib.tables import TableAccess, load_tables, tables_filename
+
+# Fuel trim analysis of datalogs against a table (the VE table by default).
+#
+#   python -m lib.veanalysis --cal calrom-tuner.bin live_data_001.bin [...]
+#
+# Every closed-loop sample is looked up in the table with the cursor's
+# bilinear weights, its total fuel trim (STFT + LTFT, mean of both banks)
+# is accumulated per cell. The result is the weighted mean trim of every
+# cell, the hits, and the table corrected by those trims.
+
+TRIM_CHANNELS = (("STFT Bank 1", "LTFT Bank 1"), ("STFT Bank 2", "LTFT Bank 2"))
+STOICH_AFR = 14.7
+
+class TrimAnalysis:
+    def __init__(self, model, xchannel, ychannel, afr_tolerance=0.2, min_coolant=70):
+        self.stats = CellStats(model)
+        self.xchannel = xchannel
+        self.ychannel = ychannel
+        self.afr_tolerance = afr_tolerance
+        self.min_coolant = min_coolant
+        self.samples = 0
+        self.used = 0
+
+    def add_log(self, filename):
+        log = DataLogReader(filename)
+        try:
+            names = set(h['name'] for h in log.channels)
+            needed = set((self.xchannel, self.ychannel, "Target AFR", "Coolant")) | set(n for bank in TRIM_CHANNELS for n in bank)
+            missing = needed - names
+            if(missing): raise KeyError(f"{filename} does not log {', '.join(sorted(missing))}!")
+            for timestamps, columns in log.columns():
+                self.add(columns)
+        finally:
+            log.close()
+
+    def add(self, columns):
+        trims = TRIM_CHANNELS
+        if(numpy != None):
+            trim = sum(columns[s] + columns[l] for s, l in trims) / len(trims)
+            # Closed loop at stoichiometry on a warm engine only
+            keep = ((abs(columns["Target AFR"] - STOICH_AFR) <= self.afr_tolerance) &
+                (columns["Coolant"] >= self.min_coolant))
+            self.samples += len(trim)
+            self.used += int(keep.sum())
+            self.stats.add(columns[self.xchannel][keep], columns[self.ychannel][keep], trim[keep])
+            return
+        xs, ys, values = [], [], []
+        for i in range(len(columns[self.xchannel])):
+            self.samples += 1
+            if(abs(columns["Target AFR"][i] - STOICH_AFR) > self.afr_tolerance): continue
+            if(columns["Coolant"][i] < self.min_coolant): continue
+            xs.append(columns[self.xchannel][i])
+            ys.append(columns[self.ychannel][i])
+            values.append(sum(columns[s][i] + columns[l][i] for s, l in trims) / len(trims))
+        self.used += len(values)
+        self.stats.add(xs, ys, values)
+
+    def corrected(self, min_weight):
+        # Table values scaled by the mean trims, unchanged without enough data.
+        model = self.stats.model
+        trims = self.stats.mean(min_weight)
+        return [[float(model.data[y][x]) * (1 + trims[y][x] / 100) if(trims[y][x] != None) else float(model.data[y][x])
+            for x in range(model.xsize)] for y in range(model.ysize)]
+
+def write_grid(writer, title, model, rows, fmt):
+    writer.writerow([title] + [f"{v:.0f}" for v in model.xdata])
+    for y, row in zip(model.ydata, rows):
+        writer.writerow([f"{y:.0f}"] + ["" if(v == None) else fmt.format(v) for v in row])
+    writer.writerow([])
+
+def main():
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Fuel trim corrections of a table from datalogs.")
+    parser.add_argument("logs", nargs='+', help="binary datalogs (live_data_NNN.bin)")
+    parser.add_argument("--cal", required=True, help="calibration export (calrom-tuner.bin) holding the table")
+    parser.add_argument("-s", "--sym", default=None, help="symbol file (default: from the firmware ID of the calibration)")
+    parser.add_argument("-t", "--table", default="Efficiency", help="table name in the .tables file")
+    parser.add_argument("--min-weight", type=float, default=20.0, help="samples (weight) needed to correct a cell")
+    parser.add_argument("--afr-tolerance", type=float, default=0.2, help="closed loop: |target AFR - 14.7| at most")
+    parser.add_argument("--min-coolant", type=float, default=70.0, help="coolant temperature at least")
+    parser.add_argument("-o", "--output", default=None, help="CSV with trims, weights, hits and the corrected table")
+    args = parser.parse_args()
+
+    with open(args.cal, 'rb') as f:
+        cal = bytearray(f.read())
+    if(args.sym):
+        sym = SYMMap(args.sym)
+    else:
+        # The calibration starts with its firmware ID.
+        registry = SymbolRegistry(os.path.join(script_dir, "patch"))
+        if(bytes(cal[:4]) not in registry.ids()): raise KeyError(f"Unknown firmware {bytes(cal[:4])}, give --sym!")
+        sym = registry.get(bytes(cal[:4]))
+    tables = {t['name']: t for t in load_tables(tables_filename(sym.file))}
+    if(args.table not in tables): raise KeyError(f"Unknown table {args.table}!")
+    table = tables[args.table]
+    image = MemoryImage(sym.get_sym_addr("cal_base"), 0)
+    image.data = cal
+    access = TableAccess(table, sym, image)
+    model = TableModel(access.read_axis('x'), access.read_axis('y'), access.read_data())
+
+    analysis = TrimAnalysis(model, table['x']['live'], table['y']['live'], args.afr_tolerance, args.min_coolant)
+    for filename in args.logs:
+        analysis.add_log(filename)
+    print(f"{analysis.used} of {analysis.samples} samples used.")
+
+    stats = analysis.stats
+    trims = stats.mean(args.min_weight)
+    cells = sum(v != None for row in trims for v in row)
+    print(f"{cells} of {model.xsize*model.ysize} cells have at least {args.min_weight:g} samples.")
+    output = args.output or os.path.splitext(args.logs[0])[0] + "-trims.csv"
+    with open(output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        write_grid(writer, "Trim %", model, trims, "{:.2f}")
+        write_grid(writer, "Weight", model, stats.rows(stats.weight), "{:.1f}")
+        write_grid(writer, "Hits", model, stats.rows(stats.hits), "{:d}")
+        write_grid(writer, "Corrected", model, [access.scaling.quantize(row) for row in analysis.corrected(args.min_weight)], table['fmt'])
+    print(f"{output} written.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())